@@ -0,0 +1,192 @@
+"""Fan-out of ad create/update/delete events to Server-Sent Events subscribers.
+
+One upstream feed (a Mongo change stream, or local publishes from the ad
+handlers when change streams are unavailable) is shared by every open
+connection. Each subscriber gets a bounded queue; a client that cannot keep
+up is told to resync instead of letting its backlog grow without limit.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Fields small enough to stream; clients fetch the full ad (with images) on demand
+EVENT_FIELDS = ("ad_id", "user_id", "title", "category", "subcategory", "price", "is_paid", "status", "created_at", "expires_at")
+
+
+class SubscriberLimitReached(Exception):
+    pass
+
+
+def ad_event(event_type: str, ad: dict) -> dict:
+    event = {"type": event_type}
+    for field in EVENT_FIELDS:
+        if field in ad:
+            value = ad[field]
+            event[field] = value.isoformat() if hasattr(value, "isoformat") else value
+    location = ad.get("location") or {}
+    event["country"] = location.get("country")
+    return event
+
+
+class Subscription:
+    __slots__ = ("category", "country", "user_id", "queue", "dropped", "_overflowed")
+
+    def __init__(self, category: Optional[str], country: Optional[str], queue_size: int, user_id: Optional[str] = None):
+        self.category = category
+        self.country = country
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._overflowed = False
+
+    def wants(self, event: dict) -> bool:
+        if self.category and event.get("category") != self.category:
+            return False
+        if self.country and event.get("country") != self.country:
+            return False
+        if self.user_id and event.get("user_id") != self.user_id:
+            return False
+        return True
+
+    def offer(self, message: tuple):
+        if self._overflowed:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: discard its backlog and ask it to refetch the list
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, {"type": "resync"}))
+            self._overflowed = True
+
+    async def next(self, timeout: float) -> Optional[tuple]:
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if message[1].get("type") == "resync":
+            self._overflowed = False
+        return message
+
+
+class AdEventBroker:
+    def __init__(self, max_subscribers: int = 5000, queue_size: int = 100):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.source = "local"
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._watch_task: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "delivered": 0, "rejected_subscribers": 0}
+
+    def subscribe(
+        self,
+        category: Optional[str] = None,
+        country: Optional[str] = None,
+        user_id: Optional[str] = None,
+        queue_size: Optional[int] = None,
+    ) -> Subscription:
+        """Add a subscriber; ``queue_size=0`` gives an unbounded queue for in-process consumers."""
+        if len(self._subscribers) >= self.max_subscribers:
+            self.stats["rejected_subscribers"] += 1
+            raise SubscriberLimitReached()
+        subscription = Subscription(category, country, self.queue_size if queue_size is None else queue_size, user_id)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, event: dict):
+        self.stats["published"] += 1
+        message = (next(self._ids), event)
+        for subscription in self._subscribers:
+            if subscription.wants(event):
+                subscription.offer(message)
+                self.stats["delivered"] += 1
+
+    def publish_local(self, event: dict):
+        # With a change stream running the same write arrives from Mongo, so skip it here
+        if self.source == "local":
+            self.publish(event)
+
+    async def start(self, collection, mode: str = "auto"):
+        if mode == "local":
+            return
+        # Change streams need a replica set or a sharded cluster
+        try:
+            hello = await collection.database.command("hello")
+            supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except PyMongoError as e:
+            supported = False
+            logger.warning(f"Could not check change stream support: {e}")
+        if not supported:
+            if mode == "change_stream":
+                raise RuntimeError("AD_EVENTS_SOURCE=change_stream requires a replica set")
+            logger.info("Change streams unavailable, using in-process ad events")
+            return
+        self.source = "change_stream"
+        self._watch_task = asyncio.create_task(self._watch(collection))
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self, collection):
+        resume_token = None
+        delay = 1.0
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        while True:
+            try:
+                async with collection.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                    delay = 1.0
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        ad = change.get("fullDocument")
+                        if not ad:
+                            continue
+                        if change["operationType"] == "insert":
+                            event_type = "create"
+                        elif ad.get("status") == "deleted":
+                            event_type = "delete"
+                        else:
+                            event_type = "update"
+                        self.publish(ad_event(event_type, ad))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ad change stream interrupted, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "source": self.source,
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "dropped": sum(s.dropped for s in self._subscribers),
+        }
+
+
+def format_sse(event_id: Optional[int], event: dict) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
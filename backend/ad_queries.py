@@ -0,0 +1,71 @@
+"""Index plan for the ad listing query.
+
+Every supported filter/sort combination maps onto one of a small, fixed set
+of compound indexes laid out as equality fields, then the sort key, then the
+price range (the ESR rule). Broad listings (only filters the index prefix
+covers) are hinted onto the chosen index so MongoDB walks it in sort order
+and never falls back to a blocking in-memory sort. Listings with other
+filters (text search, geo, a price range outside a price sort, equality
+fields beyond the prefix) may match very few ads; walking in sort order
+would then scan most of the index, so the planner picks the index and a
+top-k sort bounded by the limit does the rest.
+"""
+from typing import Dict, List, Tuple
+
+# Equality filters with a dedicated index prefix, most specific first
+EQUALITY_PREFIXES = [
+    ("category", "subcategory"),
+    ("category", "location.country"),
+    ("category",),
+    ("location.country",),
+    (),
+]
+
+SORT_KEYS = {
+    "featured": [("rank_key", -1)],
+    "newest": [("created_at", -1)],
+    "price_asc": [("price", 1)],
+    "price_desc": [("price", -1)],
+}
+
+SORT_OPTIONS = tuple(SORT_KEYS) + ("distance",)
+
+
+def _index_keys(prefix: Tuple[str, ...], sort: str) -> List[Tuple[str, int]]:
+    keys = [("status", 1)] + [(field, 1) for field in prefix]
+    if sort in ("featured", "newest"):
+        # Trailing price lets min/max price be checked in the index before fetching
+        keys += [SORT_KEYS[sort][0], ("price", 1)]
+    else:
+        # price_desc walks the same index backwards
+        keys += [("price", 1)]
+    return keys
+
+
+def planned_indexes() -> List[List[Tuple[str, int]]]:
+    indexes = []
+    for prefix in EQUALITY_PREFIXES:
+        for sort in ("featured", "newest", "price_asc"):
+            indexes.append(_index_keys(prefix, sort))
+    return indexes
+
+
+def plan_listing(query: Dict[str, object], sort: str):
+    """Return ``(sort_spec, hint)`` for a listing query; ``hint`` may be None.
+
+    The longest planned prefix whose fields are all constrained by the query
+    is chosen. The query is only hinted onto it when every filter is covered
+    by that prefix (or is the price range of a price sort). ``distance``
+    sorting is served by the 2dsphere index through ``$nearSphere`` and
+    gets neither.
+    """
+    if sort == "distance":
+        return None, None
+    prefix = next(p for p in EQUALITY_PREFIXES if all(field in query for field in p))
+    covered = {"status", *prefix}
+    if sort in ("price_asc", "price_desc"):
+        # The range bounds the walk over the price sort key itself
+        covered.add("price")
+    if any(field not in covered for field in query):
+        return SORT_KEYS[sort], None
+    return SORT_KEYS[sort], _index_keys(prefix, sort)
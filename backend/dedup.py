@@ -0,0 +1,170 @@
+"""Near-duplicate ad detection with MinHash signatures and LSH banding.
+
+An ad's title and description are reduced to word 3-gram shingles and then
+to a fixed-size MinHash signature, whose fraction of equal slots estimates
+the Jaccard similarity of two ads. Signatures are split into bands; ads that
+share any band land in the same bucket, so a new ad is only compared with
+the handful of ads it collides with instead of every active ad.
+
+Signatures are stored as raw bytes (256 with the default 64 permutations)
+in a separate ``ad_fingerprints`` collection keyed by ``ad_id``, so the
+index can be reloaded at startup without re-shingling every ad.
+"""
+import hashlib
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    tokens = TOKEN_RE.findall((text or "").lower())
+    if len(tokens) < size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def image_hashes(images: Optional[Iterable[str]]) -> List[str]:
+    # Images are stored inline (data URIs) or as URLs; either way the string is the content
+    return sorted({hashlib.sha1(image.encode("utf-8")).hexdigest()[:16] for image in images or [] if image})
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        items = shingles(text)
+        if not items:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        hashes = np.fromiter(
+            (zlib.crc32(item.encode("utf-8")) for item in items), dtype=np.uint64, count=len(items)
+        )
+        # (a * x + b) mod p for every permutation and shingle at once; a, x < 2^32 keeps it in uint64
+        permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def pack(signature: np.ndarray) -> bytes:
+        return signature.astype("<u4").tobytes()
+
+    @staticmethod
+    def unpack(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+
+class DuplicateIndex:
+    """LSH index of active ads, scoped to the posting user."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.8, image_threshold: float = 0.5):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.image_threshold = image_threshold
+        self._lock = threading.Lock()
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._owners: Dict[str, str] = {}
+        self._images: Dict[str, List[str]] = {}
+        self._image_owners: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, title: str, description: str) -> np.ndarray:
+        return self.hasher.signature(f"{title or ''}\n{description or ''}")
+
+    def _band_keys(self, user_id: str, signature: np.ndarray):
+        prefix = user_id.encode("utf-8") + b"\x00"
+        for band in range(self.bands):
+            yield band, prefix + signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, ad_id: str, user_id: str, signature: np.ndarray, images: Optional[List[str]] = None):
+        with self._lock:
+            self._remove_locked(ad_id)
+            for band, key in self._band_keys(user_id, signature):
+                self._buckets[band].setdefault(key, set()).add(ad_id)
+            self._signatures[ad_id] = signature
+            self._owners[ad_id] = user_id
+            self._images[ad_id] = list(images or [])
+            for image in self._images[ad_id]:
+                self._image_owners.setdefault(image, set()).add(ad_id)
+
+    def remove(self, ad_id: str):
+        with self._lock:
+            self._remove_locked(ad_id)
+
+    def retain(self, ad_ids: Set[str]):
+        """Drop every ad not in ``ad_ids``, e.g. ones that expired meanwhile."""
+        with self._lock:
+            for ad_id in [ad_id for ad_id in self._signatures if ad_id not in ad_ids]:
+                self._remove_locked(ad_id)
+
+    def _remove_locked(self, ad_id: str):
+        signature = self._signatures.pop(ad_id, None)
+        if signature is None:
+            return
+        user_id = self._owners.pop(ad_id)
+        for band, key in self._band_keys(user_id, signature):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(ad_id)
+                if not bucket:
+                    del self._buckets[band][key]
+        for image in self._images.pop(ad_id, []):
+            owners = self._image_owners.get(image)
+            if owners is not None:
+                owners.discard(ad_id)
+                if not owners:
+                    del self._image_owners[image]
+
+    def find(
+        self,
+        user_id: str,
+        signature: np.ndarray,
+        images: Optional[List[str]] = None,
+        exclude: Optional[str] = None,
+    ) -> Optional[Tuple[str, float]]:
+        """Return ``(ad_id, similarity)`` of the closest duplicate, if any."""
+        with self._lock:
+            candidates = set()
+            for band, key in self._band_keys(user_id, signature):
+                candidates |= self._buckets[band].get(key, set())
+            shared_images = set()
+            for image in images or []:
+                shared_images |= {
+                    ad_id for ad_id in self._image_owners.get(image, ()) if self._owners.get(ad_id) == user_id
+                }
+            candidates |= shared_images
+            candidates.discard(exclude)
+
+            best = None
+            for ad_id in candidates:
+                similarity = float(np.mean(self._signatures[ad_id] == signature))
+                # A shared photo lowers the bar: same picture, lightly reworded text
+                threshold = self.image_threshold if ad_id in shared_images else self.threshold
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (ad_id, similarity)
+            return best
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "ads": len(self._signatures),
+                "buckets": sum(len(bucket) for bucket in self._buckets),
+                "images": len(self._image_owners),
+                "bands": self.bands,
+                "rows_per_band": self.rows,
+                "threshold": self.threshold,
+            }
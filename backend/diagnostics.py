@@ -0,0 +1,223 @@
+"""Runtime introspection used by the health, readiness and diagnostics endpoints."""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+from pymongo import monitoring
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks Motor/PyMongo connection pool usage from CMAP events.
+
+    PyMongo emits these events from its own worker threads, so counters are
+    guarded by a lock rather than relying on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        key = f"{address[0]}:{address[1]}"
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "wait_queue": 0,
+                "created_total": 0,
+                "closed_total": 0,
+                "checkout_failures": 0,
+                "cleared_total": 0,
+            }
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared_total"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] += 1
+            pool["created_total"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] = max(pool["open"] - 1, 0)
+            pool["closed_total"] += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address)["wait_queue"] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["wait_queue"] = max(pool["wait_queue"] - 1, 0)
+            pool["checkout_failures"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["wait_queue"] = max(pool["wait_queue"] - 1, 0)
+            pool["checked_out"] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] = max(pool["checked_out"] - 1, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed-interval sleep."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.avg_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            # Exponentially weighted so a single stall does not dominate
+            self.avg_lag = 0.9 * self.avg_lag + 0.1 * lag
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self):
+        return {
+            "interval_ms": round(self.interval * 1000, 3),
+            "last_ms": round(self.last_lag * 1000, 3),
+            "avg_ms": round(self.avg_lag * 1000, 3),
+            "max_ms": round(self.max_lag * 1000, 3),
+        }
+
+
+class OutboundClientStats:
+    """Counts requests and connections made through a shared aiohttp session."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests_total = 0
+        self.failures_total = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.in_flight += 1
+            self.requests_total += 1
+
+        async def on_request_end(session, ctx, params):
+            self.in_flight = max(self.in_flight - 1, 0)
+
+        async def on_request_exception(session, ctx, params):
+            self.in_flight = max(self.in_flight - 1, 0)
+            self.failures_total += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def snapshot(self, session: Optional[aiohttp.ClientSession] = None):
+        stats = {
+            "in_flight": self.in_flight,
+            "requests_total": self.requests_total,
+            "failures_total": self.failures_total,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+        }
+        if session is not None and session.connector is not None:
+            stats["limit"] = session.connector.limit
+            stats["limit_per_host"] = session.connector.limit_per_host
+            stats["closed"] = session.closed
+        return stats
+
+
+class ReadinessProbe:
+    """Runs a dependency check at most once per ``ttl`` seconds.
+
+    Concurrent callers share a single in-flight check, so a burst of load
+    balancer probes results in one ping instead of a stampede.
+    """
+
+    def __init__(self, check: Callable[[], Awaitable[object]], ttl: float = 2.0, timeout: float = 1.0):
+        self._check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+
+    def _fresh(self):
+        return self._result is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def status(self) -> dict:
+        if self._fresh():
+            return self._result
+        async with self._lock:
+            if self._fresh():
+                return self._result
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._check(), timeout=self.timeout)
+                result = {"ready": True}
+            except asyncio.TimeoutError:
+                result = {"ready": False, "error": f"timed out after {self.timeout}s"}
+            except Exception as e:
+                result = {"ready": False, "error": str(e)}
+            result["latency_ms"] = round((time.monotonic() - started) * 1000, 3)
+            self._result = result
+            self._checked_at = time.monotonic()
+            return result
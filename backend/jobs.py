@@ -0,0 +1,338 @@
+"""Durable background jobs stored in MongoDB.
+
+Jobs are claimed atomically with ``find_one_and_update`` and held under a
+lease. A worker that dies mid-job simply stops renewing its lease, and the
+job becomes claimable again once the lease expires. Finished jobs carry a
+BSON date ``expire_at`` and are removed by a TTL index after a retention
+period, so the collection only grows with the live backlog.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict, dict], Awaitable[None]]
+
+
+def utc_iso(dt: Optional[datetime] = None) -> str:
+    # Fixed precision keeps ISO strings lexicographically ordered in Mongo range queries
+    return (dt or datetime.now(timezone.utc)).isoformat(timespec="microseconds")
+
+
+JOB_STATUSES = ("queued", "running", "done", "dead")
+
+
+class JobQueue:
+    def __init__(
+        self,
+        collection,
+        retry_base_delay: float = 5.0,
+        retry_max_delay: float = 600.0,
+        done_retention: timedelta = timedelta(days=1),
+        dead_retention: timedelta = timedelta(days=7),
+    ):
+        self.collection = collection
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.done_retention = done_retention
+        # Dead jobs are kept longer so failures can still be inspected
+        self.dead_retention = dead_retention
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("job_id", unique=True)
+        await self.collection.create_index(
+            [("status", ASCENDING), ("priority", DESCENDING), ("run_at", ASCENDING)]
+        )
+        await self.collection.create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+        # Only set while a job is queued or running, so finished jobs free the key
+        await self.collection.create_index("dedupe_key", unique=True, sparse=True)
+        await self.collection.create_index("expire_at", expireAfterSeconds=0)
+        # Jobs that finished before retention existed
+        now = datetime.now(timezone.utc)
+        for status, retention in (("done", self.done_retention), ("dead", self.dead_retention)):
+            await self.collection.update_many(
+                {"status": status, "expire_at": {"$exists": False}},
+                {"$set": {"expire_at": now + retention}}
+            )
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: Optional[dict] = None,
+        priority: int = 0,
+        delay: float = 0,
+        max_attempts: int = 5,
+        dedupe_key: Optional[str] = None,
+    ) -> Optional[str]:
+        """Add a job; returns None if an active job already holds ``dedupe_key``."""
+        now = datetime.now(timezone.utc)
+        job_id = f"job_{uuid.uuid4().hex[:12]}"
+        job_doc = {
+            "job_id": job_id,
+            "type": job_type,
+            "payload": payload or {},
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_at": utc_iso(now + timedelta(seconds=delay)),
+            "created_at": utc_iso(now),
+            "updated_at": utc_iso(now),
+        }
+        if dedupe_key:
+            job_doc["dedupe_key"] = dedupe_key
+        try:
+            await self.collection.insert_one(job_doc)
+        except DuplicateKeyError:
+            return None
+        return job_id
+
+    async def enqueue_many(self, job_type: str, payloads, priority: int = 0, max_attempts: int = 5) -> int:
+        now = utc_iso()
+        docs = [
+            {
+                "job_id": f"job_{uuid.uuid4().hex[:12]}",
+                "type": job_type,
+                "payload": payload,
+                "priority": priority,
+                "status": "queued",
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "run_at": now,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for payload in payloads
+        ]
+        if not docs:
+            return 0
+        await self.collection.insert_many(docs, ordered=False)
+        return len(docs)
+
+    async def claim(self, worker_id: str, job_types, lease_seconds: float) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        now_iso = utc_iso(now)
+        return await self.collection.find_one_and_update(
+            {
+                "type": {"$in": list(job_types)},
+                "$or": [
+                    {"status": "queued", "run_at": {"$lte": now_iso}},
+                    {"status": "running", "lease_expires_at": {"$lte": now_iso}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "started_at": now_iso,
+                    "lease_expires_at": utc_iso(now + timedelta(seconds=lease_seconds)),
+                    "updated_at": now_iso,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", DESCENDING), ("run_at", ASCENDING)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def extend_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_one(
+            {"job_id": job_id, "worker_id": worker_id, "status": "running"},
+            {"$set": {
+                "lease_expires_at": utc_iso(now + timedelta(seconds=lease_seconds)),
+                "updated_at": utc_iso(now),
+            }}
+        )
+        return result.modified_count == 1
+
+    async def complete(self, job_id: str, worker_id: str):
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {"job_id": job_id, "worker_id": worker_id, "status": "running"},
+            {"$set": {
+                "status": "done",
+                "finished_at": utc_iso(now),
+                "updated_at": utc_iso(now),
+                "expire_at": now + self.done_retention,
+            },
+             "$unset": {"dedupe_key": "", "lease_expires_at": ""}}
+        )
+
+    async def fail(self, job: dict, worker_id: str, error: str) -> str:
+        now = datetime.now(timezone.utc)
+        if job["attempts"] >= job.get("max_attempts", 1):
+            status = "dead"
+            update = {
+                "$set": {
+                    "status": "dead",
+                    "last_error": error,
+                    "finished_at": utc_iso(now),
+                    "updated_at": utc_iso(now),
+                    "expire_at": now + self.dead_retention,
+                },
+                "$unset": {"dedupe_key": "", "lease_expires_at": ""},
+            }
+        else:
+            status = "queued"
+            delay = min(self.retry_base_delay * 2 ** (job["attempts"] - 1), self.retry_max_delay)
+            update = {
+                "$set": {
+                    "status": "queued",
+                    "last_error": error,
+                    "run_at": utc_iso(now + timedelta(seconds=delay)),
+                    "updated_at": utc_iso(now),
+                },
+                "$unset": {"lease_expires_at": ""},
+            }
+        await self.collection.update_one(
+            {"job_id": job["job_id"], "worker_id": worker_id, "status": "running"},
+            update
+        )
+        return status
+
+    async def metrics(self) -> dict:
+        # One count per status is answered from the status index instead of scanning every job
+        counts = {}
+        for status in JOB_STATUSES:
+            counts[status] = await self.collection.count_documents({"status": status})
+
+        # Lag: how long the oldest due job has been waiting to be claimed
+        oldest = await self.collection.find_one(
+            {"status": "queued", "run_at": {"$lte": utc_iso()}},
+            {"_id": 0, "run_at": 1},
+            sort=[("run_at", ASCENDING)]
+        )
+        lag = 0.0
+        if oldest:
+            lag = (datetime.now(timezone.utc) - datetime.fromisoformat(oldest["run_at"])).total_seconds()
+        return {"counts": counts, "lag_seconds": round(max(lag, 0.0), 3)}
+
+
+class JobWorker:
+    """Claims and runs jobs with a fixed number of concurrent slots.
+
+    ``periodic`` maps a job type to an interval in seconds; the worker keeps
+    one instance of each queued, using a dedupe key so several worker
+    processes do not schedule duplicates.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = 4,
+        lease_seconds: float = 60.0,
+        poll_interval: float = 1.0,
+        periodic: Optional[Dict[str, float]] = None,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.periodic = periodic or {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks = []
+        self._stopping = asyncio.Event()
+        self.stats = {"claimed": 0, "completed": 0, "retried": 0, "dead": 0, "lease_lost": 0}
+        self._busy = 0
+        self._run_time_total = 0.0
+        self._started_at = None
+
+    async def start(self):
+        self._stopping.clear()
+        self._started_at = time.monotonic()
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._slot()))
+        if self.periodic:
+            self._tasks.append(asyncio.create_task(self._scheduler()))
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self):
+        await self.start()
+        await self._stopping.wait()
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _scheduler(self):
+        while not self._stopping.is_set():
+            for job_type, interval in self.periodic.items():
+                try:
+                    await self.queue.enqueue(job_type, delay=interval, dedupe_key=f"periodic:{job_type}")
+                except Exception:
+                    logger.exception(f"Failed to schedule periodic job {job_type}")
+            await self._sleep(min(self.periodic.values()) / 2)
+
+    async def _slot(self):
+        idle_delay = self.poll_interval
+        while not self._stopping.is_set():
+            try:
+                job = await self.queue.claim(self.worker_id, self.handlers.keys(), self.lease_seconds)
+            except Exception:
+                logger.exception("Job claim failed")
+                job = None
+            if job is None:
+                # Back off while idle so empty queues cost few queries
+                await self._sleep(idle_delay)
+                idle_delay = min(idle_delay * 2, self.poll_interval * 10)
+                continue
+            idle_delay = self.poll_interval
+            await self._run(job)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.queue.extend_lease(job_id, self.worker_id, self.lease_seconds):
+                self.stats["lease_lost"] += 1
+                return
+
+    async def _run(self, job: dict):
+        self.stats["claimed"] += 1
+        self._busy += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job["job_id"]))
+        started = time.monotonic()
+        try:
+            await self.handlers[job["type"]](job["payload"], job)
+        except Exception as e:
+            logger.warning(f"Job {job['job_id']} ({job['type']}) failed: {e}")
+            status = await self.queue.fail(job, self.worker_id, str(e))
+            self.stats["dead" if status == "dead" else "retried"] += 1
+        else:
+            await self.queue.complete(job["job_id"], self.worker_id)
+            self.stats["completed"] += 1
+        finally:
+            heartbeat.cancel()
+            self._busy -= 1
+            self._run_time_total += time.monotonic() - started
+
+    def snapshot(self):
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        finished = self.stats["completed"] + self.stats["retried"] + self.stats["dead"]
+        return {
+            **self.stats,
+            "worker_id": self.worker_id,
+            "busy": self._busy,
+            "concurrency": self.concurrency,
+            "throughput_per_min": round(self.stats["completed"] / uptime * 60, 3) if uptime else 0.0,
+            "avg_run_ms": round(self._run_time_total / finished * 1000, 3) if finished else 0.0,
+        }
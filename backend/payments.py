@@ -0,0 +1,162 @@
+"""Batch reconciliation of pending checkout sessions."""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_QUERY = {
+    "payment_status": {"$in": ["pending", "unpaid"]},
+    "status": {"$ne": "expired"},
+}
+
+
+class PaymentReconciler:
+    """Resolves pending payment transactions without waiting for a user poll.
+
+    ``fetch_status`` takes a checkout session id and returns an object with
+    ``status`` and ``payment_status`` attributes (a ``CheckoutStatusResponse``
+    in production, any stand-in when testing against a fake checkout API).
+    """
+
+    def __init__(
+        self,
+        transactions,
+        ads,
+        fetch_status: Callable[[str], Awaitable[object]],
+        batch_size: int = 100,
+        concurrency: int = 8,
+        stale_after: timedelta = timedelta(hours=48),
+        upgrade_fields: Callable[[], dict] = lambda: {"is_paid": True},
+    ):
+        self.transactions = transactions
+        self.ads = ads
+        self.fetch_status = fetch_status
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.stale_after = stale_after
+        self.upgrade_fields = upgrade_fields
+        self.stats = {
+            "runs": 0,
+            "batches": 0,
+            "scanned": 0,
+            "paid": 0,
+            "expired": 0,
+            "unchanged": 0,
+            "errors": 0,
+            "last_run_at": None,
+            "last_run_ms": None,
+        }
+
+    async def ensure_indexes(self):
+        await self.transactions.create_index(
+            [("payment_status", ASCENDING), ("created_at", ASCENDING), ("transaction_id", ASCENDING)]
+        )
+        await self.transactions.create_index("session_id")
+
+    async def _batches(self):
+        # Keyset pagination on the index, so each batch is a bounded range scan
+        last = None
+        while True:
+            query = dict(UNRESOLVED_QUERY)
+            if last is not None:
+                query["$or"] = [
+                    {"created_at": {"$gt": last["created_at"]}},
+                    {"created_at": last["created_at"], "transaction_id": {"$gt": last["transaction_id"]}},
+                ]
+            batch = await self.transactions.find(
+                query,
+                {"_id": 0, "transaction_id": 1, "session_id": 1, "ad_id": 1, "created_at": 1}
+            ).sort([("created_at", ASCENDING), ("transaction_id", ASCENDING)]).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return
+            yield batch
+            if len(batch) < self.batch_size:
+                return
+            last = batch[-1]
+
+    async def _check(self, semaphore: asyncio.Semaphore, transaction: dict):
+        async with semaphore:
+            try:
+                return transaction, await self.fetch_status(transaction["session_id"]), None
+            except Exception as e:
+                return transaction, None, e
+
+    def _is_stale(self, transaction: dict, now: datetime) -> bool:
+        created_at = transaction.get("created_at")
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        if created_at is None:
+            return False
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return now - created_at > self.stale_after
+
+    async def run(self) -> dict:
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        run_stats = {"scanned": 0, "paid": 0, "expired": 0, "unchanged": 0, "errors": 0}
+
+        async for batch in self._batches():
+            now = datetime.now(timezone.utc)
+            checked_at = now.isoformat()
+            results = await asyncio.gather(*(self._check(semaphore, t) for t in batch))
+
+            transaction_ops = []
+            paid_ad_ids = []
+            for transaction, status_response, error in results:
+                run_stats["scanned"] += 1
+                txn_filter = {"transaction_id": transaction["transaction_id"], "payment_status": {"$ne": "paid"}}
+
+                if status_response is not None and status_response.payment_status == "paid":
+                    run_stats["paid"] += 1
+                    transaction_ops.append(UpdateOne(txn_filter, {"$set": {
+                        "payment_status": "paid",
+                        "status": status_response.status,
+                        "checked_at": checked_at,
+                    }}))
+                    if transaction.get("ad_id"):
+                        paid_ad_ids.append(transaction["ad_id"])
+                elif status_response is not None and (
+                    status_response.status == "expired" or self._is_stale(transaction, now)
+                ):
+                    # Only a successful lookup may expire a session; a failed one could hide a payment
+                    run_stats["expired"] += 1
+                    transaction_ops.append(UpdateOne(txn_filter, {"$set": {
+                        "payment_status": "expired",
+                        "status": "expired",
+                        "checked_at": checked_at,
+                    }}))
+                elif status_response is not None:
+                    run_stats["unchanged"] += 1
+                    transaction_ops.append(UpdateOne(txn_filter, {"$set": {
+                        "payment_status": status_response.payment_status,
+                        "status": status_response.status,
+                        "checked_at": checked_at,
+                    }}))
+                else:
+                    run_stats["errors"] += 1
+                    logger.warning(f"Checkout status lookup failed for {transaction['session_id']}: {error}")
+
+            if transaction_ops:
+                await self.transactions.bulk_write(transaction_ops, ordered=False)
+            if paid_ad_ids:
+                await self.ads.update_many(
+                    {"ad_id": {"$in": paid_ad_ids}, "boosted_at": None},
+                    {"$set": self.upgrade_fields()}
+                )
+            self.stats["batches"] += 1
+
+        for key, value in run_stats.items():
+            self.stats[key] += value
+        self.stats["runs"] += 1
+        self.stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        self.stats["last_run_ms"] = round((time.monotonic() - started) * 1000, 3)
+        return run_stats
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
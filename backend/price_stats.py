@@ -0,0 +1,198 @@
+"""Incremental price distributions per category, subcategory and country.
+
+Each group keeps a count, a running sum and a quantile sketch of its active
+ads' prices. The sketch is a DDSketch-style log histogram: prices fall into
+buckets whose bounds grow by a constant ratio, so any quantile is within a
+fixed relative error of the true value. Unlike a t-digest, buckets can be
+decremented exactly, which is what ad updates and expiries need.
+
+Every ad counts towards four groups: its category alone, with its
+subcategory, with its country, and with both. ``"*"`` stands for "any".
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+ANY = "*"
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def group_key(category: str, subcategory: Optional[str] = None, country: Optional[str] = None) -> str:
+    return "|".join((category, subcategory or ANY, country or ANY))
+
+
+class PriceSketch:
+    __slots__ = ("count", "total", "zero_count", "buckets", "_gamma_log", "_sorted")
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._gamma_log = math.log(gamma)
+        self.count = 0
+        self.total = 0.0
+        self.zero_count = 0
+        self.buckets: Dict[int, int] = {}
+        self._sorted: Optional[List[Tuple[int, int]]] = None
+
+    def _bucket(self, price: float) -> int:
+        return math.ceil(math.log(price) / self._gamma_log)
+
+    def _value(self, bucket: int) -> float:
+        # Midpoint (in relative terms) of the bucket's (gamma^(i-1), gamma^i] range
+        gamma = math.exp(self._gamma_log)
+        return 2 * gamma ** bucket / (gamma + 1)
+
+    def add(self, price: float, weight: int = 1):
+        self.count += weight
+        self.total += price * weight
+        if price <= 0:
+            self.zero_count += weight
+        else:
+            bucket = self._bucket(price)
+            remaining = self.buckets.get(bucket, 0) + weight
+            if remaining > 0:
+                self.buckets[bucket] = remaining
+            else:
+                self.buckets.pop(bucket, None)
+        self._sorted = None
+
+    def remove(self, price: float):
+        self.add(price, -1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        if self._sorted is None:
+            self._sorted = sorted(self.buckets.items())
+        seen = self.zero_count
+        for bucket, bucket_count in self._sorted:
+            seen += bucket_count
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(self._sorted[-1][0])
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "zero_count": self.zero_count,
+            "buckets": [[bucket, count] for bucket, count in self.buckets.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, relative_accuracy: float = 0.01) -> "PriceSketch":
+        sketch = cls(relative_accuracy)
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {int(bucket): count for bucket, count in data["buckets"]}
+        return sketch
+
+
+class PriceStatsIndex:
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._groups: Dict[str, PriceSketch] = {}
+        # What each ad currently contributes, so updates and removals subtract exactly
+        self._ads: Dict[str, Tuple[Tuple[str, ...], float, Optional[str]]] = {}
+        # True while serving a loaded snapshot that no rebuild has replaced yet
+        self.from_snapshot = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _group_keys(category: str, subcategory: Optional[str], country: Optional[str]) -> Tuple[str, ...]:
+        keys = {group_key(category), group_key(category, subcategory), group_key(category, None, country),
+                group_key(category, subcategory, country)}
+        return tuple(keys)
+
+    def _apply(self, keys: Tuple[str, ...], price: float, weight: int):
+        for key in keys:
+            sketch = self._groups.get(key)
+            if sketch is None:
+                sketch = self._groups[key] = PriceSketch(self.relative_accuracy)
+            sketch.add(price, weight)
+            if sketch.count <= 0:
+                del self._groups[key]
+
+    def upsert(
+        self,
+        ad_id: str,
+        category: str,
+        subcategory: Optional[str],
+        country: Optional[str],
+        price: Optional[float],
+        expires_at: Optional[str] = None,
+    ):
+        with self._lock:
+            previous = self._ads.pop(ad_id, None)
+            if previous is not None:
+                self._apply(previous[0], previous[1], -1)
+            if price is None or price < 0 or not category:
+                return
+            keys = self._group_keys(category, subcategory, country)
+            self._apply(keys, price, 1)
+            self._ads[ad_id] = (keys, price, expires_at)
+
+    def remove(self, ad_id: str):
+        with self._lock:
+            previous = self._ads.pop(ad_id, None)
+            if previous is not None:
+                self._apply(previous[0], previous[1], -1)
+
+    def expire(self, now: str) -> int:
+        """Drop ads whose ISO ``expires_at`` is before ``now``; returns how many."""
+        with self._lock:
+            expired = [ad_id for ad_id, (_, _, expires_at) in self._ads.items() if expires_at and expires_at < now]
+            for ad_id in expired:
+                keys, price, _ = self._ads.pop(ad_id)
+                self._apply(keys, price, -1)
+            return len(expired)
+
+    def rebuild(self, ads):
+        """Recompute every group from ``(ad_id, category, subcategory, country, price, expires_at)`` rows."""
+        fresh = PriceStatsIndex(self.relative_accuracy)
+        for row in ads:
+            fresh.upsert(*row)
+        with self._lock:
+            self._groups, self._ads = fresh._groups, fresh._ads
+            self.from_snapshot = False
+
+    def stats(self, category: str, subcategory: Optional[str] = None, country: Optional[str] = None) -> dict:
+        with self._lock:
+            sketch = self._groups.get(group_key(category, subcategory, country))
+            if sketch is None or sketch.count <= 0:
+                return {"count": 0, "mean": None, "quantiles": {}}
+            return {
+                "count": sketch.count,
+                "mean": round(sketch.total / sketch.count, 2),
+                "quantiles": {f"p{int(q * 100)}": round(sketch.quantile(q), 2) for q in QUANTILES},
+            }
+
+    def to_documents(self) -> List[dict]:
+        """One snapshot document per group; per-ad contributions are not persisted."""
+        with self._lock:
+            return [{"group": key, **sketch.to_dict()} for key, sketch in self._groups.items()]
+
+    def load_documents(self, documents):
+        """Serve a snapshot until the next rebuild.
+
+        Ads seen only through the snapshot cannot be subtracted later, so the
+        groups drift until a rebuild restores exact per-ad state.
+        """
+        groups = {doc["group"]: PriceSketch.from_dict(doc, self.relative_accuracy) for doc in documents}
+        with self._lock:
+            if not self._ads and groups:
+                self._groups = groups
+                self.from_snapshot = True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "ads": len(self._ads),
+                "groups": len(self._groups),
+                "from_snapshot": self.from_snapshot,
+                "buckets": sum(len(sketch.buckets) for sketch in self._groups.values()),
+                "relative_accuracy": self.relative_accuracy,
+            }
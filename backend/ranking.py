@@ -0,0 +1,79 @@
+"""Precomputed listing rank for premium placement.
+
+Each ad stores an integer ``rank_key``: boosted ads get a fixed tier offset
+added to their recency timestamp (epoch milliseconds), so sorting by
+``rank_key`` descending lists active boosts first, newest first, followed by
+every other ad newest first. That keeps premium-first listings a single
+walk over one index. The key only changes when an ad is created, boosted or
+its boost expires.
+"""
+from datetime import datetime, timedelta
+
+# Larger than any epoch-millisecond timestamp we will see (year 2286)
+PREMIUM_TIER_OFFSET = 10 ** 13
+
+
+def epoch_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+def rank_key(boosted: bool, recency: datetime) -> int:
+    return (PREMIUM_TIER_OFFSET if boosted else 0) + epoch_ms(recency)
+
+
+def ranking_fields(created_at: datetime) -> dict:
+    """Fields to store on a newly created ad.
+
+    Ads start in the regular tier even when posted as premium; the boost is
+    applied once the payment is confirmed.
+    """
+    return {"rank_key": rank_key(False, created_at), "boosted_at": None, "boost_expires_at": None}
+
+
+def unboosted_filter(ad_id: str) -> dict:
+    # Matches only ads not yet boosted, so replayed payment confirmations are no-ops
+    return {"ad_id": ad_id, "boosted_at": None}
+
+
+def premium_upgrade_fields(now: datetime, boost_days: float) -> dict:
+    """``$set`` fields applied when a payment upgrades an ad to premium."""
+    return {
+        "is_paid": True,
+        "rank_key": rank_key(True, now),
+        "boosted_at": now.isoformat(),
+        "boost_expires_at": (now + timedelta(days=boost_days)).isoformat(),
+    }
+
+
+def expired_boost_filter(now: datetime) -> dict:
+    return {"rank_key": {"$gte": PREMIUM_TIER_OFFSET}, "boost_expires_at": {"$lt": now.isoformat()}}
+
+
+# Update pipeline that drops an ad back to the regular tier, ranked by creation time.
+# Clearing ``boosted_at`` lets a later payment boost the ad again.
+DEMOTE_PIPELINE = [{"$set": {
+    "rank_key": {"$toLong": {"$toDate": "$created_at"}},
+    "boosted_at": None,
+    "boost_expires_at": None,
+}}]
+
+
+def backfill_pipeline(paid: bool) -> list:
+    """Update pipeline computing ``rank_key`` for ads created before ranking existed.
+
+    ``is_paid`` is set by the client when posting, before any payment, so it
+    is not evidence of a boost. Callers pass ``paid=True`` only for ads with a
+    confirmed payment transaction; those keep their boost until the ad
+    itself expires, every other ad starts in the regular tier.
+    """
+    if not paid:
+        return [{"$set": {
+            "rank_key": {"$toLong": {"$toDate": "$created_at"}},
+            "boosted_at": None,
+            "boost_expires_at": None,
+        }}]
+    return [{"$set": {
+        "rank_key": {"$add": [PREMIUM_TIER_OFFSET, {"$toLong": {"$toDate": "$created_at"}}]},
+        "boosted_at": "$created_at",
+        "boost_expires_at": "$expires_at",
+    }}]
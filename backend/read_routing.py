@@ -0,0 +1,133 @@
+"""Per-endpoint read routing between the replica set primary and secondaries.
+
+Anonymous reads that tolerate slightly stale data (listings, search, batch
+lookups, ad detail) go to a ``secondaryPreferred`` handle bounded by
+``maxStalenessSeconds``; auth, mutations and payments keep using the
+primary.
+
+Read-your-writes is decided per request: a mutation sets a short-lived
+``last_write_at`` cookie, and that client's reads go to the primary until
+secondaries have caught up, whichever instance serves them. Ads written
+through this instance are additionally pinned in memory, so other clients
+reading them here see the write too.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import SecondaryPreferred
+
+# The smallest bound drivers accept: heartbeat frequency plus the idle write period
+MIN_MAX_STALENESS_SECONDS = 90
+
+WRITE_COOKIE = "last_write_at"
+
+
+class ReadRouter:
+    """Hands out database handles by read policy."""
+
+    def __init__(
+        self,
+        db,
+        mode: str = "secondary_preferred",
+        max_staleness_seconds: int = MIN_MAX_STALENESS_SECONDS,
+        read_concern: str = "local",
+        pin_seconds: Optional[float] = None,
+        max_pins: int = 100000,
+    ):
+        if mode not in ("primary", "secondary_preferred"):
+            raise ValueError(f"Unknown read routing mode: {mode}")
+        self.mode = mode
+        self.max_staleness_seconds = max(max_staleness_seconds, MIN_MAX_STALENESS_SECONDS)
+        # A secondary may lag by up to the staleness bound, so pin writes at least that long
+        self.pin_seconds = pin_seconds if pin_seconds is not None else float(self.max_staleness_seconds)
+        self.max_pins = max_pins
+        self.primary = db.with_options(read_preference=ReadPreference.PRIMARY)
+        if mode == "primary":
+            self.replica = self.primary
+        else:
+            self.replica = db.with_options(
+                read_preference=SecondaryPreferred(max_staleness=self.max_staleness_seconds),
+                read_concern=ReadConcern(read_concern),
+            )
+        self._pins: "OrderedDict[str, float]" = OrderedDict()
+        self.stats = {"replica_reads": 0, "pinned_reads": 0, "writer_reads": 0, "pins_recorded": 0}
+
+    def mark_writer(self, response):
+        """Set the cookie that sends this client's reads to the primary for ``pin_seconds``."""
+        response.set_cookie(
+            WRITE_COOKIE,
+            f"{time.time():.3f}",
+            max_age=math.ceil(self.pin_seconds),
+            path="/",
+            secure=True,
+            httponly=True,
+            samesite="none",
+        )
+
+    def is_recent_writer(self, request) -> bool:
+        if request is None:
+            return False
+        try:
+            written_at = float(request.cookies.get(WRITE_COOKIE, ""))
+        except ValueError:
+            return False
+        # Instances' clocks may disagree slightly, so tolerate a write stamped in the near future
+        return abs(time.time() - written_at) < self.pin_seconds
+
+    def note_write(self, ad_id: str):
+        """Route reads of ``ad_id`` to the primary until secondaries have caught up."""
+        self._pins[ad_id] = time.monotonic() + self.pin_seconds
+        self._pins.move_to_end(ad_id)
+        self.stats["pins_recorded"] += 1
+        self._prune()
+
+    def _prune(self):
+        # Pins share one duration, so insertion order is expiry order
+        now = time.monotonic()
+        while self._pins:
+            ad_id, until = next(iter(self._pins.items()))
+            if until > now and len(self._pins) <= self.max_pins:
+                break
+            self._pins.popitem(last=False)
+
+    def is_pinned(self, ad_id: str) -> bool:
+        until = self._pins.get(ad_id)
+        return until is not None and until > time.monotonic()
+
+    def for_listing(self, request=None):
+        """Handle for listing and search reads; the primary for a client that just wrote."""
+        if self.mode != "primary" and self.is_recent_writer(request):
+            self.stats["writer_reads"] += 1
+            return self.primary
+        self.stats["replica_reads"] += 1
+        return self.replica
+
+    def for_ads(self, ad_ids: Iterable[str], request=None):
+        """Handle for reads of specific ads; the primary if the client or any ad was just written."""
+        if self.mode != "primary":
+            if self.is_recent_writer(request):
+                self.stats["writer_reads"] += 1
+                return self.primary
+            if any(self.is_pinned(ad_id) for ad_id in ad_ids):
+                self.stats["pinned_reads"] += 1
+                return self.primary
+        self.stats["replica_reads"] += 1
+        return self.replica
+
+    def for_ad(self, ad_id: str, request=None):
+        return self.for_ads((ad_id,), request)
+
+    def snapshot(self) -> dict:
+        self._prune()
+        return {
+            **self.stats,
+            "mode": self.mode,
+            "max_staleness_seconds": self.max_staleness_seconds,
+            "replica_read_preference": self.replica.read_preference.mongos_mode,
+            "read_concern": self.replica.read_concern.level,
+            "active_pins": len(self._pins),
+        }
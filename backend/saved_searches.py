@@ -0,0 +1,200 @@
+"""In-memory reverse index that matches new ads against saved searches.
+
+Instead of evaluating every saved search against a new ad, searches are
+bucketed by their exact-match fields (category, subcategory, country) and,
+inside a bucket, posted under one of their keywords or the geo grid cells
+their radius covers. A new ad only probes the few buckets and postings it
+could possibly satisfy, and the resulting candidates are verified exactly.
+"""
+import math
+import re
+import threading
+import time
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+EARTH_RADIUS_KM = 6371.0
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    return set(TOKEN_RE.findall((text or "").lower()))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class _Bucket:
+    __slots__ = ("plain", "keyword", "geo", "geo_wide")
+
+    def __init__(self):
+        self.plain: Set[str] = set()
+        self.keyword: Dict[str, Set[str]] = {}
+        self.geo: Dict[Tuple[int, int], Set[str]] = {}
+        self.geo_wide: Set[str] = set()
+
+    def empty(self):
+        return not (self.plain or self.keyword or self.geo or self.geo_wide)
+
+
+class SavedSearchIndex:
+    def __init__(self, cell_degrees: float = 0.5, max_cells_per_search: int = 400):
+        self.cell_degrees = cell_degrees
+        self.max_cells_per_search = max_cells_per_search
+        self._lock = threading.Lock()
+        self._searches: Dict[str, dict] = {}
+        self._postings: Dict[str, list] = {}
+        self._buckets: Dict[tuple, _Bucket] = {}
+        self.stats = {"matches_total": 0, "ads_matched": 0, "candidates_total": 0, "last_match_us": 0.0}
+
+    def __len__(self):
+        return len(self._searches)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _cells_for_radius(self, lat: float, lng: float, radius_km: float) -> Optional[List[Tuple[int, int]]]:
+        lat_span = radius_km / 111.0
+        lng_span = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lng_lo = self._cell(max(lat - lat_span, -90.0), lng - lng_span)
+        lat_hi, lng_hi = self._cell(min(lat + lat_span, 90.0), lng + lng_span)
+        if (lat_hi - lat_lo + 1) * (lng_hi - lng_lo + 1) > self.max_cells_per_search:
+            return None
+        return list(product(range(lat_lo, lat_hi + 1), range(lng_lo, lng_hi + 1)))
+
+    @staticmethod
+    def _compile(search: dict) -> dict:
+        compiled = dict(search)
+        compiled["_tokens"] = sorted(tokenize(search.get("keywords")), key=len, reverse=True)
+        return compiled
+
+    def add(self, search: dict):
+        """Index (or re-index) a saved search document."""
+        with self._lock:
+            self._remove_locked(search["search_id"])
+            compiled = self._compile(search)
+            key = (search.get("category"), search.get("subcategory"), search.get("country"))
+            bucket = self._buckets.setdefault(key, _Bucket())
+            search_id = search["search_id"]
+            postings = []
+
+            geo = search.get("latitude") is not None and search.get("longitude") is not None and search.get("radius_km")
+            if compiled["_tokens"]:
+                # Post under the longest keyword: longer words tend to be rarer
+                token = compiled["_tokens"][0]
+                bucket.keyword.setdefault(token, set()).add(search_id)
+                postings.append(("keyword", token))
+            elif geo:
+                cells = self._cells_for_radius(search["latitude"], search["longitude"], search["radius_km"])
+                if cells is None:
+                    bucket.geo_wide.add(search_id)
+                    postings.append(("geo_wide", None))
+                else:
+                    for cell in cells:
+                        bucket.geo.setdefault(cell, set()).add(search_id)
+                        postings.append(("geo", cell))
+            else:
+                bucket.plain.add(search_id)
+                postings.append(("plain", None))
+
+            self._searches[search_id] = compiled
+            self._postings[search_id] = [key, postings]
+
+    def remove(self, search_id: str):
+        with self._lock:
+            self._remove_locked(search_id)
+
+    def _remove_locked(self, search_id: str):
+        entry = self._postings.pop(search_id, None)
+        self._searches.pop(search_id, None)
+        if entry is None:
+            return
+        key, postings = entry
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        for kind, value in postings:
+            if kind == "plain":
+                bucket.plain.discard(search_id)
+            elif kind == "geo_wide":
+                bucket.geo_wide.discard(search_id)
+            else:
+                index = bucket.keyword if kind == "keyword" else bucket.geo
+                ids = index.get(value)
+                if ids is not None:
+                    ids.discard(search_id)
+                    if not ids:
+                        del index[value]
+        if bucket.empty():
+            del self._buckets[key]
+
+    def load(self, searches: Iterable[dict]):
+        for search in searches:
+            self.add(search)
+
+    @staticmethod
+    def _verify(search: dict, ad: dict, tokens: Set[str], lat: Optional[float], lng: Optional[float]) -> bool:
+        price = ad.get("price")
+        if search.get("min_price") is not None and (price is None or price < search["min_price"]):
+            return False
+        if search.get("max_price") is not None and (price is None or price > search["max_price"]):
+            return False
+        if search["_tokens"] and not tokens.issuperset(search["_tokens"]):
+            return False
+        if search.get("radius_km") and search.get("latitude") is not None and search.get("longitude") is not None:
+            if lat is None or lng is None:
+                return False
+            if haversine_km(search["latitude"], search["longitude"], lat, lng) > search["radius_km"]:
+                return False
+        return True
+
+    def match(self, ad: dict) -> List[dict]:
+        """Return the saved searches a new ad satisfies."""
+        started = time.perf_counter()
+        tokens = tokenize(ad.get("title")) | tokenize(ad.get("description"))
+        location = ad.get("location") or {}
+        lat, lng = location.get("latitude"), location.get("longitude")
+        cell = self._cell(lat, lng) if lat is not None and lng is not None else None
+
+        matches = []
+        candidates_seen = 0
+        with self._lock:
+            for key in product(
+                (ad.get("category"), None),
+                (ad.get("subcategory"), None) if ad.get("subcategory") else (None,),
+                (location.get("country"), None) if location.get("country") else (None,),
+            ):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                candidates = set(bucket.plain)
+                candidates |= bucket.geo_wide
+                if cell is not None:
+                    candidates |= bucket.geo.get(cell, set())
+                for token in tokens:
+                    ids = bucket.keyword.get(token)
+                    if ids:
+                        candidates |= ids
+                candidates_seen += len(candidates)
+                for search_id in candidates:
+                    search = self._searches[search_id]
+                    if self._verify(search, ad, tokens, lat, lng):
+                        matches.append(search)
+
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+        self.stats["ads_matched"] += 1
+        self.stats["matches_total"] += len(matches)
+        self.stats["candidates_total"] += candidates_seen
+        self.stats["last_match_us"] = round(elapsed_us, 1)
+        return matches
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "searches": len(self._searches),
+                "buckets": len(self._buckets),
+            }
@@ -1,9 +1,13 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, ExecutionTimeout
 import os
+import asyncio
+import hmac
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
@@ -13,20 +17,71 @@ from datetime import datetime, timezone, timedelta
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 import aiohttp
 import bcrypt
+from diagnostics import MongoPoolMonitor, EventLoopLagMonitor, OutboundClientStats, ReadinessProbe
+from compression import CompressionMiddleware, PrecompressedPayload
+from webhooks import WebhookEventLedger, verify_stripe_signature
+from jobs import JobQueue, JobWorker
+from payments import PaymentReconciler
+from saved_searches import SavedSearchIndex
+from ad_events import AdEventBroker, SubscriberLimitReached, ad_event, format_sse
+from ad_queries import SORT_OPTIONS, plan_listing, planned_indexes
+from suggest import SuggestIndex
+from similar import SimilarAdsIndex
+from dedup import DuplicateIndex, MinHasher, image_hashes
+from read_routing import ReadRouter
+from price_stats import PriceStatsIndex
+from ranking import DEMOTE_PIPELINE, backfill_pipeline, expired_boost_filter, premium_upgrade_fields, ranking_fields, unboosted_filter
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+def env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_monitor = MongoPoolMonitor()
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=env_int('MONGO_MAX_POOL_SIZE', 100),
+    minPoolSize=env_int('MONGO_MIN_POOL_SIZE', 0),
+    maxIdleTimeMS=env_int('MONGO_MAX_IDLE_TIME_MS', None),
+    waitQueueTimeoutMS=env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', None),
+    serverSelectionTimeoutMS=env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+    connectTimeoutMS=env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+    socketTimeoutMS=env_int('MONGO_SOCKET_TIMEOUT_MS', None),
+    event_listeners=[pool_monitor],
+)
 db = client[os.environ['DB_NAME']]
 
+# Anonymous reads may use secondaries; auth, mutations and payments use `db` (primary)
+read_router = ReadRouter(
+    db,
+    mode=os.environ.get('MONGO_READ_ROUTING', 'secondary_preferred'),
+    max_staleness_seconds=env_int('MONGO_MAX_STALENESS_SECONDS', 90),
+    read_concern=os.environ.get('MONGO_REPLICA_READ_CONCERN', 'local'),
+)
+
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shared outbound HTTP client, created on startup so connections are pooled
+http_session: Optional[aiohttp.ClientSession] = None
+outbound_stats = OutboundClientStats()
+loop_lag_monitor = EventLoopLagMonitor(interval=env_float('LOOP_LAG_INTERVAL_SECONDS', 0.5))
+readiness_probe = ReadinessProbe(
+    lambda: db.command("ping"),
+    ttl=env_float('READINESS_CACHE_SECONDS', 2.0),
+    timeout=env_float('READINESS_TIMEOUT_SECONDS', 1.0),
+)
+
 # Ad categories with subcategories
 AD_CATEGORIES = {
     "jobs": {
@@ -55,10 +110,16 @@ AD_CATEGORIES = {
     }
 }
 
-# Helper function to get user from session
-async def get_current_user(request: Request, authorization: Optional[str] = Header(None)):
-    session_token = None
-    
+# AD_CATEGORIES never changes at runtime, so the categories response is built once
+categories_payload = PrecompressedPayload(
+    [
+        {"id": cat_id, "name": cat_data["name"], "subcategories": cat_data["subcategories"]}
+        for cat_id, cat_data in AD_CATEGORIES.items()
+    ],
+    max_age=env_int('CATEGORIES_MAX_AGE_SECONDS', 3600),
+)
+
+def request_session_token(request: Request, authorization: Optional[str] = None) -> Optional[str]:
     # Try cookie first
     session_token = request.cookies.get("session_token")
     
@@ -67,6 +128,22 @@ async def get_current_user(request: Request, authorization: Optional[str] = Head
         if authorization.startswith("Bearer "):
             session_token = authorization.replace("Bearer ", "")
     
+    return session_token
+
+def client_address(request: Request) -> Optional[str]:
+    # Behind N trusted proxies the Nth X-Forwarded-For entry from the right is the one the
+    # outermost proxy saw; entries left of it are client-supplied and can be forged
+    hops = env_int('TRUSTED_PROXY_HOPS', 0)
+    if hops:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.client.host if request.client else None
+
+# Helper function to get user from session
+async def get_current_user(request: Request, authorization: Optional[str] = Header(None)):
+    session_token = request_session_token(request, authorization)
+    
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
@@ -93,6 +170,10 @@ async def get_current_user(request: Request, authorization: Optional[str] = Head
     
     return user_doc
 
+def seller_summary(user: dict) -> dict:
+    # Embedded in ads so listings and detail pages need no users lookup
+    return {"name": user.get("name"), "picture": user.get("picture")}
+
 # Models
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -163,6 +244,22 @@ class PaymentTransaction(BaseModel):
     payment_status: str
     created_at: datetime
 
+class AdBatchRequest(BaseModel):
+    ids: List[str]
+    view: str = "full"
+
+class SavedSearchCreate(BaseModel):
+    name: Optional[str] = None
+    category: Optional[str] = None
+    subcategory: Optional[str] = None
+    country: Optional[str] = None
+    keywords: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_km: Optional[float] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
 # Auth endpoints
 @api_router.post("/auth/register")
 async def register(user_data: UserRegistration):
@@ -249,15 +346,14 @@ async def google_session(request: Request):
         raise HTTPException(status_code=400, detail="Session ID required")
     
     # Call Emergent Auth API
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-            headers={"X-Session-ID": session_id}
-        ) as response:
-            if response.status != 200:
-                raise HTTPException(status_code=400, detail="Invalid session")
-            
-            data = await response.json()
+    async with http_session.get(
+        "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+        headers={"X-Session-ID": session_id}
+    ) as response:
+        if response.status != 200:
+            raise HTTPException(status_code=400, detail="Invalid session")
+        
+        data = await response.json()
     
     # Check if user exists
     user_doc = await db.users.find_one({"email": data["email"]}, {"_id": 0})
@@ -281,6 +377,14 @@ async def google_session(request: Request):
             {"user_id": user_id},
             {"$set": {"name": data["name"], "picture": data.get("picture")}}
         )
+        if seller_summary(user_doc) != seller_summary(data):
+            # Fan the new name/picture out to the user's ads in the background; the job reads
+            # the latest profile, so one queued job per user covers repeated logins
+            try:
+                await job_queue.enqueue("sync_seller_summary", {"user_id": user_id}, dedupe_key=f"seller_summary:{user_id}")
+            except Exception as e:
+                # The login itself succeeded; ads keep the old summary until the next change
+                logger.error(f"Seller summary sync enqueue failed for {user_id}: {str(e)}")
     
     # Store session
     session_token = data["session_token"]
@@ -329,6 +433,7 @@ async def logout(request: Request, authorization: Optional[str] = Header(None)):
 # Ad endpoints
 @api_router.get("/ads")
 async def get_ads(
+    request: Request,
     category: Optional[str] = None, 
     subcategory: Optional[str] = None, 
     search: Optional[str] = None,
@@ -336,8 +441,22 @@ async def get_ads(
     lat: Optional[float] = None,
     lng: Optional[float] = None,
     radius: Optional[float] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: str = "featured",
     limit: int = 20
 ):
+    if sort not in SORT_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of: {', '.join(SORT_OPTIONS)}")
+    
+    if sort == "distance" and (lat is None or lng is None):
+        raise HTTPException(status_code=400, detail="Sorting by distance requires lat and lng")
+    
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price cannot be greater than max_price")
+    
+    limit = max(1, min(limit, env_int('ADS_MAX_LIMIT', 100)))
+    
     query = {"status": "active"}
     
     if category and category in AD_CATEGORIES:
@@ -349,8 +468,20 @@ async def get_ads(
     if country:
         query["location.country"] = country
     
+    if min_price is not None or max_price is not None:
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    
     # Geospatial search: find ads within radius (in kilometers) of given coordinates
-    if lat is not None and lng is not None and radius is not None:
+    if sort == "distance":
+        # $nearSphere returns nearest first using the 2dsphere index
+        query["location.coordinates"] = {"$nearSphere": [lng, lat]}
+        if radius is not None:
+            query["location.coordinates"]["$maxDistance"] = radius / 6371
+    elif lat is not None and lng is not None and radius is not None:
         # Convert radius from km to radians (Earth radius = 6371 km)
         radius_in_radians = radius / 6371
         query["location.coordinates"] = {
@@ -365,7 +496,24 @@ async def get_ads(
             {"description": {"$regex": search, "$options": "i"}}
         ]
     
-    ads = await db.ads.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    # Broad listings walk a planned index in sort order; selective ones are left to the planner
+    sort_spec, hint = plan_listing(query, sort)
+    cursor = read_router.for_listing(request).ads.find(query, {"_id": 0}).max_time_ms(env_int('ADS_QUERY_MAX_TIME_MS', 2000))
+    if sort_spec:
+        cursor = cursor.sort(sort_spec)
+    if hint:
+        cursor = cursor.hint(hint)
+    
+    try:
+        ads = await cursor.limit(limit).to_list(limit)
+    except ExecutionTimeout:
+        raise HTTPException(status_code=400, detail="Query too broad, please narrow the filters")
+    
+    # Only searches that found something, counted per client, can become suggestions
+    if search and ads:
+        client_key = await suggest_client_key(request)
+        if client_key:
+            suggest_index.record_query(search, client_key)
     
     # Convert datetime strings
     for ad in ads:
@@ -376,9 +524,342 @@ async def get_ads(
     
     return ads
 
+# Autocomplete
+suggest_index = SuggestIndex(
+    popular_query_min=env_int('SUGGEST_POPULAR_QUERY_MIN', 3),
+)
+
+async def suggest_client_key(request: Request) -> Optional[str]:
+    # A signed-in user counts once however many sessions they hold; a made-up token is not a user
+    session_token = request_session_token(request, request.headers.get("authorization"))
+    if session_token:
+        session_doc = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0, "user_id": 1})
+        if session_doc:
+            return f"user:{session_doc['user_id']}"
+    address = client_address(request)
+    return f"ip:{address}" if address else None
+
+def load_suggest_taxonomy():
+    for cat_id, cat_data in AD_CATEGORIES.items():
+        suggest_index.add_term(cat_data["name"], "category", category=cat_id)
+        for subcategory in cat_data["subcategories"]:
+            if subcategory != "Other":
+                suggest_index.add_term(subcategory, "subcategory", category=cat_id)
+
+async def refresh_suggest_index():
+    ads = await db.ads.find({"status": "active"}, {"_id": 0, "ad_id": 1, "title": 1}).to_list(None)
+    suggest_index.sync_ads((ad["ad_id"], ad.get("title")) for ad in ads)
+
+# Similar ads
+similar_index = SimilarAdsIndex(text_dims=env_int('SIMILAR_TEXT_DIMS', 256))
+SIMILAR_FIELDS = {"_id": 0, "ad_id": 1, "title": 1, "description": 1, "category": 1, "price": 1, "location": 1}
+
+async def rebuild_similar_index():
+    ads = await db.ads.find({"status": "active"}, SIMILAR_FIELDS).to_list(None)
+    # Vectorizing every ad is CPU bound, keep it off the event loop
+    await asyncio.to_thread(similar_index.rebuild, ads)
+
+# Duplicate ad detection
+duplicate_index = DuplicateIndex(
+    threshold=env_float('DUPLICATE_AD_THRESHOLD', 0.8),
+    image_threshold=env_float('DUPLICATE_AD_IMAGE_THRESHOLD', 0.5),
+)
+DUPLICATE_FIELDS = {"_id": 0, "ad_id": 1, "user_id": 1, "title": 1, "description": 1, "images": 1}
+
+def ad_fingerprint(ad: dict) -> dict:
+    signature = duplicate_index.signature(ad.get("title"), ad.get("description"))
+    return {
+        "ad_id": ad["ad_id"],
+        "user_id": ad["user_id"],
+        "minhash": MinHasher.pack(signature),
+        "image_hashes": image_hashes(ad.get("images")),
+    }
+
+def index_fingerprint(fingerprint: dict):
+    duplicate_index.add(
+        fingerprint["ad_id"],
+        fingerprint["user_id"],
+        MinHasher.unpack(fingerprint["minhash"]),
+        fingerprint["image_hashes"],
+    )
+
+def check_duplicate_ad(fingerprint: dict, exclude: Optional[str] = None) -> dict:
+    """Reject a repost of the user's own active ad, or return the fields that flag it."""
+    match = duplicate_index.find(
+        fingerprint["user_id"],
+        MinHasher.unpack(fingerprint["minhash"]),
+        fingerprint["image_hashes"],
+        exclude=exclude,
+    )
+    if match is None:
+        return {"duplicate_of": None, "duplicate_score": None}
+    
+    duplicate_id, similarity = match
+    if os.environ.get('DUPLICATE_AD_ACTION', 'reject') == 'reject':
+        raise HTTPException(
+            status_code=409,
+            detail=f"This ad looks like a repost of your active ad {duplicate_id}. Please edit that ad instead."
+        )
+    return {"duplicate_of": duplicate_id, "duplicate_score": round(similarity, 3)}
+
+async def load_duplicate_index():
+    # Signatures are stored precomputed, so loading skips shingling every ad
+    active_ids = {
+        ad["ad_id"] for ad in await db.ads.find({"status": "active"}, {"_id": 0, "ad_id": 1}).to_list(None)
+    }
+    duplicate_index.retain(active_ids)
+    missing = set(active_ids)
+    stale = []
+    async for fingerprint in db.ad_fingerprints.find({}, {"_id": 0}):
+        if fingerprint["ad_id"] in active_ids:
+            index_fingerprint(fingerprint)
+            missing.discard(fingerprint["ad_id"])
+        else:
+            stale.append(fingerprint["ad_id"])
+    
+    # Ads posted before fingerprints existed
+    missing = list(missing)
+    batch_size = 500
+    for start in range(0, len(missing), batch_size):
+        ads = await db.ads.find({"ad_id": {"$in": missing[start:start + batch_size]}}, DUPLICATE_FIELDS).to_list(None)
+        fingerprints = [ad_fingerprint(ad) for ad in ads]
+        if fingerprints:
+            await db.ad_fingerprints.bulk_write(
+                [UpdateOne({"ad_id": f["ad_id"]}, {"$set": f}, upsert=True) for f in fingerprints],
+                ordered=False
+            )
+        for fingerprint in fingerprints:
+            index_fingerprint(fingerprint)
+    for start in range(0, len(stale), batch_size):
+        await db.ad_fingerprints.delete_many({"ad_id": {"$in": stale[start:start + batch_size]}})
+
+# Price statistics
+price_stats = PriceStatsIndex(relative_accuracy=env_float('PRICE_STATS_RELATIVE_ACCURACY', 0.01))
+PRICE_STATS_FIELDS = {"_id": 0, "ad_id": 1, "category": 1, "subcategory": 1, "location.country": 1, "price": 1, "expires_at": 1}
+
+async def rebuild_price_stats():
+    ads = await db.ads.find({"status": "active"}, PRICE_STATS_FIELDS).to_list(None)
+    rows = [
+        (ad["ad_id"], ad.get("category"), ad.get("subcategory"), (ad.get("location") or {}).get("country"), ad.get("price"), ad.get("expires_at"))
+        for ad in ads
+    ]
+    await asyncio.to_thread(price_stats.rebuild, rows)
+
+async def expire_price_stats():
+    # Expiry is a bulk update that emits no local events, so sweep the in-memory copy
+    price_stats.expire(datetime.now(timezone.utc).isoformat())
+
+async def save_price_stats_snapshot():
+    # A loaded snapshot has drifted by the events applied on top of it, so don't write it back
+    if price_stats.from_snapshot:
+        return
+    taken_at = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+    documents = price_stats.to_documents()
+    if documents:
+        await db.price_stats.bulk_write(
+            [ReplaceOne({"group": doc["group"]}, {**doc, "taken_at": taken_at}, upsert=True) for doc in documents],
+            ordered=False
+        )
+    # Groups that emptied since the last snapshot. Other instances write the same collection,
+    # so only drop groups this one no longer has and that nobody rewrote since this snapshot began.
+    await db.price_stats.delete_many({
+        "group": {"$nin": [doc["group"] for doc in documents]},
+        "taken_at": {"$lt": taken_at},
+    })
+
+async def load_price_stats_snapshot():
+    price_stats.load_documents(await db.price_stats.find({}, {"_id": 0, "taken_at": 0}).to_list(None))
+
+async def apply_ad_event_to_indexes(event: dict):
+    # Writes made through other instances pin the ad here too
+    read_router.note_write(event["ad_id"])
+    
+    if event["type"] == "delete" or event.get("status") != "active":
+        price_stats.remove(event["ad_id"])
+        suggest_index.remove_ad(event["ad_id"])
+        similar_index.remove(event["ad_id"])
+        duplicate_index.remove(event["ad_id"])
+        return
+    
+    price_stats.upsert(
+        event["ad_id"],
+        event.get("category"),
+        event.get("subcategory"),
+        event.get("country"),
+        event.get("price"),
+        event.get("expires_at"),
+    )
+    suggest_index.upsert_ad(event["ad_id"], event.get("title"))
+    # Events carry no description, so fetch the fields the vectors need
+    ad = await db.ads.find_one({"ad_id": event["ad_id"], "status": "active"}, SIMILAR_FIELDS)
+    if ad:
+        similar_index.upsert(ad)
+    
+    fingerprint = await db.ad_fingerprints.find_one({"ad_id": event["ad_id"]}, {"_id": 0})
+    if fingerprint:
+        index_fingerprint(fingerprint)
+
+async def run_ad_index_feed():
+    # Ad mutations arrive through the live feed; periodic full refreshes catch expiries and drift.
+    # Refreshes run between events, so events arriving during a rebuild wait in the feed's own
+    # unbounded queue and are applied after its swap instead of overflowing it into a resync.
+    subscription = ad_event_broker.subscribe(queue_size=0)
+    loop = asyncio.get_running_loop()
+    run_now = float("-inf")
+    # [interval, refresh, last run, rerun after a resync]
+    refreshes = [
+        [env_float('SUGGEST_REFRESH_SECONDS', 600.0), refresh_suggest_index, loop.time(), True],
+        [env_float('SIMILAR_REBUILD_SECONDS', 3600.0), rebuild_similar_index, run_now, True],
+        [env_float('DUPLICATE_INDEX_REFRESH_SECONDS', 3600.0), load_duplicate_index, run_now, True],
+        # A loaded snapshot is served until the first scheduled rebuild instead of a full scan at startup
+        [env_float('PRICE_STATS_REBUILD_SECONDS', 3600.0), rebuild_price_stats,
+         loop.time() if price_stats.from_snapshot else run_now, True],
+        [env_float('PRICE_STATS_EXPIRY_SWEEP_SECONDS', 300.0), expire_price_stats, loop.time(), False],
+        [env_float('PRICE_STATS_SNAPSHOT_SECONDS', 300.0), save_price_stats_snapshot, loop.time(), False],
+    ]
+    try:
+        while True:
+            try:
+                for refresh in refreshes:
+                    interval, refresh_fn, last_run, _ = refresh
+                    if loop.time() - last_run >= interval:
+                        refresh[2] = loop.time()
+                        await refresh_fn()
+                message = await subscription.next(timeout=60.0)
+                if message is not None:
+                    event = message[1]
+                    if event["type"] == "resync":
+                        # Events were lost, so only state built from them needs a full reload
+                        for refresh in refreshes:
+                            if refresh[3]:
+                                refresh[2] = run_now
+                    else:
+                        await apply_ad_event_to_indexes(event)
+            except Exception as e:
+                logger.error(f"Ad index update failed: {str(e)}")
+    finally:
+        ad_event_broker.unsubscribe(subscription)
+
+@api_router.get("/stats/prices")
+async def get_price_stats(category: str, subcategory: Optional[str] = None, country: Optional[str] = None):
+    if category not in AD_CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid category")
+    
+    return {
+        "category": category,
+        "subcategory": subcategory,
+        "country": country,
+        **price_stats.stats(category, subcategory, country)
+    }
+
+@api_router.get("/suggest")
+async def suggest(q: str = "", limit: int = 8):
+    return {"query": q, "suggestions": suggest_index.suggest(q, max(1, min(limit, 20)))}
+
+ad_event_broker = AdEventBroker(
+    max_subscribers=env_int('AD_EVENTS_MAX_SUBSCRIBERS', 5000),
+    queue_size=env_int('AD_EVENTS_QUEUE_SIZE', 100),
+)
+
+@api_router.get("/ads/stream")
+async def stream_ads(
+    request: Request, category: Optional[str] = None, country: Optional[str] = None, user_id: Optional[str] = None
+):
+    try:
+        subscription = ad_event_broker.subscribe(category=category, country=country, user_id=user_id)
+    except SubscriberLimitReached:
+        raise HTTPException(status_code=503, detail="Too many live feed subscribers", headers={"Retry-After": "30"})
+    
+    heartbeat_seconds = env_float('AD_EVENTS_HEARTBEAT_SECONDS', 15.0)
+    
+    async def event_source():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                message = await subscription.next(timeout=heartbeat_seconds)
+                if message is None:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(*message)
+        finally:
+            ad_event_broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# List view: only the first image, which is what cards render as a thumbnail
+AD_LIST_PROJECTION = {"_id": 0, "images": {"$slice": 1}}
+
+async def get_ads_by_ids(ids: List[str], view: str, request: Request):
+    if view not in ("full", "list"):
+        raise HTTPException(status_code=400, detail="View must be 'full' or 'list'")
+    
+    # De-duplicate while keeping the requested order
+    ids = list(dict.fromkeys(ad_id.strip() for ad_id in ids if ad_id.strip()))
+    max_ids = env_int('AD_BATCH_MAX_IDS', 100)
+    if len(ids) > max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {max_ids} ids per request")
+    if not ids:
+        return {"results": []}
+    
+    projection = AD_LIST_PROJECTION if view == "list" else {"_id": 0}
+    ads = await read_router.for_ads(ids, request).ads.find({"ad_id": {"$in": ids}}, projection).to_list(len(ids))
+    
+    found = {}
+    for ad in ads:
+        if isinstance(ad.get("created_at"), str):
+            ad["created_at"] = datetime.fromisoformat(ad["created_at"])
+        if isinstance(ad.get("expires_at"), str):
+            ad["expires_at"] = datetime.fromisoformat(ad["expires_at"])
+        found[ad["ad_id"]] = ad
+    
+    return {
+        "results": [
+            {"ad_id": ad_id, "found": True, "ad": found[ad_id]} if ad_id in found else {"ad_id": ad_id, "found": False}
+            for ad_id in ids
+        ]
+    }
+
+@api_router.get("/ads/batch")
+async def get_ads_batch(request: Request, ids: str, view: str = "full"):
+    return await get_ads_by_ids(ids.split(","), view, request)
+
+@api_router.post("/ads/batch")
+async def post_ads_batch(batch: AdBatchRequest, request: Request):
+    return await get_ads_by_ids(batch.ids, batch.view, request)
+
+@api_router.get("/ads/{ad_id}/similar")
+async def get_similar_ads(request: Request, ad_id: str, limit: int = 6):
+    ad = await read_router.for_ad(ad_id, request).ads.find_one({"ad_id": ad_id}, SIMILAR_FIELDS)
+    
+    if not ad:
+        raise HTTPException(status_code=404, detail="Ad not found")
+    
+    matches = similar_index.similar(ad, max(1, min(limit, 24)))
+    scores = dict(matches)
+    
+    ads = await read_router.for_listing(request).ads.find(
+        {"ad_id": {"$in": list(scores)}, "status": "active"},
+        AD_LIST_PROJECTION
+    ).to_list(len(scores))
+    ads.sort(key=lambda similar: scores[similar["ad_id"]], reverse=True)
+    
+    for similar in ads:
+        similar["score"] = round(scores[similar["ad_id"]], 4)
+        if isinstance(similar.get("created_at"), str):
+            similar["created_at"] = datetime.fromisoformat(similar["created_at"])
+        if isinstance(similar.get("expires_at"), str):
+            similar["expires_at"] = datetime.fromisoformat(similar["expires_at"])
+    
+    return {"ad_id": ad_id, "results": ads}
+
 @api_router.get("/ads/{ad_id}")
-async def get_ad(ad_id: str):
-    ad = await db.ads.find_one({"ad_id": ad_id}, {"_id": 0})
+async def get_ad(ad_id: str, request: Request):
+    ad = await read_router.for_ad(ad_id, request).ads.find_one({"ad_id": ad_id}, {"_id": 0})
     
     if not ad:
         raise HTTPException(status_code=404, detail="Ad not found")
@@ -392,7 +873,7 @@ async def get_ad(ad_id: str):
     return ad
 
 @api_router.post("/ads")
-async def create_ad(ad_data: AdCreate, request: Request, authorization: Optional[str] = Header(None)):
+async def create_ad(ad_data: AdCreate, request: Request, response: Response, authorization: Optional[str] = Header(None)):
     user = await get_current_user(request, authorization)
     
     # Validate category
@@ -423,9 +904,11 @@ async def create_ad(ad_data: AdCreate, request: Request, authorization: Optional
         "price": ad_data.price,
         "images": ad_data.images,
         "is_paid": ad_data.is_paid,
+        "seller": seller_summary(user),
         "status": "active",
         "created_at": created_at.isoformat(),
-        "expires_at": expires_at.isoformat()
+        "expires_at": expires_at.isoformat(),
+        **ranking_fields(created_at)
     }
     
     # Add location data if provided
@@ -438,10 +921,26 @@ async def create_ad(ad_data: AdCreate, request: Request, authorization: Optional
             "coordinates": [ad_data.location.longitude, ad_data.location.latitude]  # GeoJSON format [lng, lat]
         }
     
+    # Fingerprint first, so other instances can index the ad as soon as they see it
+    fingerprint = ad_fingerprint(ad_doc)
+    ad_doc.update(check_duplicate_ad(fingerprint))
+    await db.ad_fingerprints.update_one({"ad_id": ad_id}, {"$set": fingerprint}, upsert=True)
+    
     await db.ads.insert_one(ad_doc)
+    read_router.note_write(ad_id)
+    read_router.mark_writer(response)
+    index_fingerprint(fingerprint)
+    
+    # Alert users whose saved searches match the new ad; the ad is already
+    # stored, so a failure here must not turn the response into an error
+    try:
+        await enqueue_saved_search_alerts(ad_doc)
+    except Exception as e:
+        logger.error(f"Saved search alerts failed for {ad_id}: {str(e)}")
     
     # Get the inserted ad without MongoDB _id field
     inserted_ad = await db.ads.find_one({"ad_id": ad_id}, {"_id": 0})
+    ad_event_broker.publish_local(ad_event("create", inserted_ad))
     
     # Convert datetime strings back to datetime objects for response
     if isinstance(inserted_ad.get("created_at"), str):
@@ -452,7 +951,7 @@ async def create_ad(ad_data: AdCreate, request: Request, authorization: Optional
     return inserted_ad
 
 @api_router.put("/ads/{ad_id}")
-async def update_ad(ad_id: str, ad_data: AdUpdate, request: Request, authorization: Optional[str] = Header(None)):
+async def update_ad(ad_id: str, ad_data: AdUpdate, request: Request, response: Response, authorization: Optional[str] = Header(None)):
     user = await get_current_user(request, authorization)
     
     # Find ad
@@ -495,11 +994,23 @@ async def update_ad(ad_id: str, ad_data: AdUpdate, request: Request, authorizati
             "coordinates": [ad_data.location.longitude, ad_data.location.latitude]
         }
     
+    fingerprint = None
+    if {"title", "description", "images"} & update_data.keys():
+        fingerprint = ad_fingerprint({**ad, **update_data})
+        update_data.update(check_duplicate_ad(fingerprint, exclude=ad_id))
+        await db.ad_fingerprints.update_one({"ad_id": ad_id}, {"$set": fingerprint}, upsert=True)
+    
     if update_data:
         await db.ads.update_one({"ad_id": ad_id}, {"$set": update_data})
+        read_router.note_write(ad_id)
+        read_router.mark_writer(response)
     
     # Get updated ad
     updated_ad = await db.ads.find_one({"ad_id": ad_id}, {"_id": 0})
+    if fingerprint is not None and updated_ad.get("status") == "active":
+        index_fingerprint(fingerprint)
+    if update_data:
+        ad_event_broker.publish_local(ad_event("update", updated_ad))
     
     if isinstance(updated_ad.get("created_at"), str):
         updated_ad["created_at"] = datetime.fromisoformat(updated_ad["created_at"])
@@ -509,7 +1020,7 @@ async def update_ad(ad_id: str, ad_data: AdUpdate, request: Request, authorizati
     return updated_ad
 
 @api_router.delete("/ads/{ad_id}")
-async def delete_ad(ad_id: str, request: Request, authorization: Optional[str] = Header(None)):
+async def delete_ad(ad_id: str, request: Request, response: Response, authorization: Optional[str] = Header(None)):
     user = await get_current_user(request, authorization)
     
     # Find ad
@@ -524,6 +1035,10 @@ async def delete_ad(ad_id: str, request: Request, authorization: Optional[str] =
     
     # Soft delete
     await db.ads.update_one({"ad_id": ad_id}, {"$set": {"status": "deleted"}})
+    read_router.note_write(ad_id)
+    read_router.mark_writer(response)
+    duplicate_index.remove(ad_id)
+    ad_event_broker.publish_local(ad_event("delete", {**ad, "status": "deleted"}))
     
     return {"message": "Ad deleted successfully"}
 
@@ -544,6 +1059,130 @@ async def get_my_ads(request: Request, authorization: Optional[str] = Header(Non
     
     return ads
 
+# Saved search endpoints
+saved_search_index = SavedSearchIndex(
+    cell_degrees=env_float('SAVED_SEARCH_CELL_DEGREES', 0.5),
+    max_cells_per_search=env_int('SAVED_SEARCH_MAX_CELLS', 400),
+)
+saved_search_synced_at: Optional[str] = None
+
+async def sync_saved_searches():
+    # Picks up searches created or deleted through other API processes
+    global saved_search_synced_at
+    query = {} if saved_search_synced_at is None else {"updated_at": {"$gt": saved_search_synced_at}}
+    if saved_search_synced_at is None:
+        query["status"] = "active"
+    # Overlap windows slightly to tolerate clock skew between processes; re-adding is idempotent
+    synced_at = (datetime.now(timezone.utc) - timedelta(seconds=5)).isoformat()
+    async for search in db.saved_searches.find(query, {"_id": 0}):
+        if search["status"] == "active":
+            saved_search_index.add(search)
+        else:
+            saved_search_index.remove(search["search_id"])
+    saved_search_synced_at = synced_at
+
+async def run_saved_search_sync():
+    while True:
+        await asyncio.sleep(env_float('SAVED_SEARCH_SYNC_SECONDS', 30.0))
+        try:
+            await sync_saved_searches()
+        except Exception as e:
+            logger.error(f"Saved search sync failed: {str(e)}")
+
+async def enqueue_saved_search_alerts(ad_doc: dict):
+    matches = [
+        {"search_id": search["search_id"], "user_id": search["user_id"]}
+        for search in saved_search_index.match(ad_doc)
+        if search["user_id"] != ad_doc["user_id"]
+    ]
+    if not matches:
+        return
+    
+    batch_size = env_int('SAVED_SEARCH_ALERT_BATCH_SIZE', 500)
+    await job_queue.enqueue_many(
+        "notify_saved_search_matches",
+        [
+            {"ad_id": ad_doc["ad_id"], "title": ad_doc["title"], "matches": matches[i:i + batch_size]}
+            for i in range(0, len(matches), batch_size)
+        ]
+    )
+
+@api_router.post("/saved-searches")
+async def create_saved_search(search_data: SavedSearchCreate, request: Request, authorization: Optional[str] = Header(None)):
+    user = await get_current_user(request, authorization)
+    
+    # Validate category
+    if search_data.category and search_data.category not in AD_CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid category")
+    
+    # Validate subcategory
+    if search_data.subcategory:
+        if not search_data.category or search_data.subcategory not in AD_CATEGORIES[search_data.category]["subcategories"]:
+            raise HTTPException(status_code=400, detail="Invalid subcategory for selected category")
+    
+    # Validate geo radius
+    if search_data.radius_km is not None and (search_data.latitude is None or search_data.longitude is None):
+        raise HTTPException(status_code=400, detail="Latitude and longitude required with radius")
+    
+    count = await db.saved_searches.count_documents({"user_id": user["user_id"], "status": "active"})
+    if count >= env_int('MAX_SAVED_SEARCHES_PER_USER', 50):
+        raise HTTPException(status_code=400, detail="Saved search limit reached")
+    
+    now = datetime.now(timezone.utc).isoformat()
+    search_doc = {
+        "search_id": f"search_{uuid.uuid4().hex[:12]}",
+        "user_id": user["user_id"],
+        **search_data.model_dump(),
+        "status": "active",
+        "created_at": now,
+        "updated_at": now
+    }
+    
+    await db.saved_searches.insert_one(search_doc)
+    search_doc.pop("_id", None)
+    saved_search_index.add(search_doc)
+    
+    return search_doc
+
+@api_router.get("/saved-searches")
+async def get_saved_searches(request: Request, authorization: Optional[str] = Header(None)):
+    user = await get_current_user(request, authorization)
+    
+    searches = await db.saved_searches.find(
+        {"user_id": user["user_id"], "status": "active"},
+        {"_id": 0}
+    ).sort("created_at", -1).to_list(100)
+    
+    return searches
+
+@api_router.delete("/saved-searches/{search_id}")
+async def delete_saved_search(search_id: str, request: Request, authorization: Optional[str] = Header(None)):
+    user = await get_current_user(request, authorization)
+    
+    # Soft delete so other processes see the removal on their next sync
+    result = await db.saved_searches.update_one(
+        {"search_id": search_id, "user_id": user["user_id"], "status": "active"},
+        {"$set": {"status": "deleted", "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    
+    saved_search_index.remove(search_id)
+    
+    return {"message": "Saved search deleted successfully"}
+
+@api_router.get("/notifications")
+async def get_notifications(request: Request, authorization: Optional[str] = Header(None), limit: int = 50):
+    user = await get_current_user(request, authorization)
+    
+    notifications = await db.notifications.find(
+        {"user_id": user["user_id"]},
+        {"_id": 0}
+    ).sort("created_at", -1).limit(min(limit, 100)).to_list(100)
+    
+    return notifications
+
 # Payment endpoints
 @api_router.post("/payment/create-session")
 async def create_payment_session(request: Request, authorization: Optional[str] = Header(None)):
@@ -603,7 +1242,7 @@ async def create_payment_session(request: Request, authorization: Optional[str]
     return {"url": session.url, "session_id": session.session_id}
 
 @api_router.get("/payment/status/{session_id}")
-async def get_payment_status(session_id: str, request: Request, authorization: Optional[str] = Header(None)):
+async def get_payment_status(session_id: str, request: Request, response: Response, authorization: Optional[str] = Header(None)):
     user = await get_current_user(request, authorization)
     
     # Find transaction
@@ -616,7 +1255,12 @@ async def get_payment_status(session_id: str, request: Request, authorization: O
         raise HTTPException(status_code=404, detail="Transaction not found")
     
     # If already processed, return status
-    if transaction["payment_status"] in ["paid", "complete"]:
+    if transaction["payment_status"] in ["paid", "complete", "expired"]:
+        return transaction
+    
+    # Checked very recently (by another poll or the reconciler): skip the upstream call
+    checked_at = transaction.get("checked_at")
+    if checked_at and datetime.now(timezone.utc) - datetime.fromisoformat(checked_at) < timedelta(seconds=env_float('PAYMENT_STATUS_CACHE_SECONDS', 5.0)):
         return transaction
     
     # Check with Stripe
@@ -630,20 +1274,23 @@ async def get_payment_status(session_id: str, request: Request, authorization: O
     # Update transaction
     update_data = {
         "payment_status": status_response.payment_status,
-        "status": status_response.status
+        "status": status_response.status,
+        "checked_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.payment_transactions.update_one(
-        {"session_id": session_id},
+        {"session_id": session_id, "payment_status": {"$ne": "paid"}},
         {"$set": update_data}
     )
     
     # If paid and ad_id exists, upgrade ad to premium
     if status_response.payment_status == "paid" and transaction.get("ad_id"):
         await db.ads.update_one(
-            {"ad_id": transaction["ad_id"]},
-            {"$set": {"is_paid": True}}
+            unboosted_filter(transaction["ad_id"]),
+            {"$set": premium_upgrade_fields(datetime.now(timezone.utc), env_float('PREMIUM_BOOST_DAYS', 7.0))}
         )
+        read_router.note_write(transaction["ad_id"])
+        read_router.mark_writer(response)
     
     # Get updated transaction
     updated_transaction = await db.payment_transactions.find_one(
@@ -653,59 +1300,267 @@ async def get_payment_status(session_id: str, request: Request, authorization: O
     
     return updated_transaction
 
-@api_router.post("/webhook/stripe")
-async def stripe_webhook(request: Request):
-    body = await request.body()
-    signature = request.headers.get("Stripe-Signature")
+async def process_stripe_event(event: dict):
+    # Async payment methods complete unpaid and report the payment in a later event
+    if event["event_type"] not in ("checkout.session.completed", "checkout.session.async_payment_succeeded"):
+        return
+    
+    await db.payment_transactions.update_one(
+        {"session_id": event["session_id"], "payment_status": {"$ne": "paid"}},
+        {"$set": {
+            "payment_status": event["payment_status"],
+            "status": "complete"
+        }}
+    )
+    
+    # Only a paid session buys premium placement
+    if event["payment_status"] != "paid":
+        return
+    
+    transaction = await db.payment_transactions.find_one(
+        {"session_id": event["session_id"]},
+        {"_id": 0}
+    )
+    
+    if transaction and transaction.get("ad_id"):
+        await db.ads.update_one(
+            unboosted_filter(transaction["ad_id"]),
+            {"$set": premium_upgrade_fields(datetime.now(timezone.utc), env_float('PREMIUM_BOOST_DAYS', 7.0))}
+        )
+        read_router.note_write(transaction["ad_id"])
+
+stripe_event_ledger = WebhookEventLedger(
+    db.stripe_events,
+    process_stripe_event,
+    concurrency=env_int('WEBHOOK_WORKER_CONCURRENCY', 4),
+    max_attempts=env_int('WEBHOOK_MAX_ATTEMPTS', 5),
+    retry_delay=env_float('WEBHOOK_RETRY_DELAY_SECONDS', 1.0),
+    lease_seconds=env_float('WEBHOOK_LEASE_SECONDS', 60.0),
+)
+
+async def verify_stripe_event(request: Request, body: bytes, signature: Optional[str]) -> dict:
+    # Verify locally when the signing secret is configured: no upstream round trip
+    webhook_secret = os.environ.get("STRIPE_WEBHOOK_SECRET")
+    if webhook_secret:
+        return verify_stripe_signature(body, signature, webhook_secret)
     
     stripe_api_key = os.environ.get("STRIPE_API_KEY")
     origin_url = str(request.base_url).rstrip("/")
     webhook_url = f"{origin_url}/api/webhook/stripe"
     stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
     
+    webhook_response = await stripe_checkout.handle_webhook(body, signature)
+    return {
+        "event_id": webhook_response.event_id,
+        "event_type": webhook_response.event_type,
+        "session_id": webhook_response.session_id,
+        "payment_status": webhook_response.payment_status,
+        "metadata": webhook_response.metadata or {},
+    }
+
+@api_router.post("/webhook/stripe")
+async def stripe_webhook(request: Request):
+    body = await request.body()
+    signature = request.headers.get("Stripe-Signature")
+    
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        
-        # Update transaction based on webhook
-        if webhook_response.event_type == "checkout.session.completed":
-            await db.payment_transactions.update_one(
-                {"session_id": webhook_response.session_id},
-                {"$set": {
-                    "payment_status": webhook_response.payment_status,
-                    "status": "complete"
-                }}
-            )
-            
-            # Upgrade ad to premium if applicable
-            transaction = await db.payment_transactions.find_one(
-                {"session_id": webhook_response.session_id},
-                {"_id": 0}
-            )
-            
-            if transaction and transaction.get("ad_id"):
-                await db.ads.update_one(
-                    {"ad_id": transaction["ad_id"]},
-                    {"$set": {"is_paid": True}}
-                )
-        
-        return {"status": "success"}
+        event = await verify_stripe_event(request, body, signature)
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    
+    if not event.get("event_id"):
+        raise HTTPException(status_code=400, detail="Event ID required")
+    
+    # Acknowledge right away; the ledger worker applies the event asynchronously
+    if not await stripe_event_ledger.record(event):
+        return {"status": "success", "duplicate": True}
+    
+    return {"status": "success"}
 
 @api_router.get("/categories")
-async def get_categories():
-    categories = []
-    for cat_id, cat_data in AD_CATEGORIES.items():
-        categories.append({
-            "id": cat_id,
-            "name": cat_data["name"],
-            "subcategories": cat_data["subcategories"]
-        })
-    return categories
+async def get_categories(request: Request):
+    return categories_payload.response(request)
+
+# Background jobs
+job_queue = JobQueue(
+    db.jobs,
+    retry_base_delay=env_float('JOB_RETRY_BASE_DELAY_SECONDS', 5.0),
+    retry_max_delay=env_float('JOB_RETRY_MAX_DELAY_SECONDS', 600.0),
+    done_retention=timedelta(hours=env_float('JOB_DONE_RETENTION_HOURS', 24.0)),
+    dead_retention=timedelta(hours=env_float('JOB_DEAD_RETENTION_HOURS', 168.0)),
+)
+
+async def expire_ads_job(payload: dict, job: dict):
+    now = datetime.now(timezone.utc).isoformat()
+    result = await db.ads.update_many(
+        {"status": "active", "expires_at": {"$lt": now}},
+        {"$set": {"status": "expired"}}
+    )
+    if result.modified_count:
+        logger.info(f"Expired {result.modified_count} ads")
+
+async def fetch_checkout_status(session_id: str) -> CheckoutStatusResponse:
+    stripe_api_key = os.environ.get("STRIPE_API_KEY")
+    webhook_url = f"{os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')}/api/webhook/stripe"
+    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    return await stripe_checkout.get_checkout_status(session_id)
+
+payment_reconciler = PaymentReconciler(
+    db.payment_transactions,
+    db.ads,
+    fetch_checkout_status,
+    batch_size=env_int('PAYMENT_RECONCILE_BATCH_SIZE', 100),
+    concurrency=env_int('PAYMENT_RECONCILE_CONCURRENCY', 8),
+    stale_after=timedelta(hours=env_float('PAYMENT_SESSION_STALE_HOURS', 48.0)),
+    upgrade_fields=lambda: premium_upgrade_fields(datetime.now(timezone.utc), env_float('PREMIUM_BOOST_DAYS', 7.0)),
+)
+
+async def reconcile_payments_job(payload: dict, job: dict):
+    result = await payment_reconciler.run()
+    if result["scanned"]:
+        logger.info(f"Payment reconciliation: {result}")
+
+async def notify_saved_search_matches_job(payload: dict, job: dict):
+    now = datetime.now(timezone.utc).isoformat()
+    notifications = [
+        {
+            # Deterministic id so a retried batch does not duplicate alerts
+            "notification_id": f"ntf_{match['search_id']}_{payload['ad_id']}",
+            "user_id": match["user_id"],
+            "search_id": match["search_id"],
+            "ad_id": payload["ad_id"],
+            "title": payload["title"],
+            "read": False,
+            "created_at": now
+        }
+        for match in payload["matches"]
+    ]
+    try:
+        await db.notifications.insert_many(notifications, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate key errors come from a previous partial attempt and are expected
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+async def expire_boosts_job(payload: dict, job: dict):
+    result = await db.ads.update_many(expired_boost_filter(datetime.now(timezone.utc)), DEMOTE_PIPELINE)
+    if result.modified_count:
+        logger.info(f"Ended premium placement for {result.modified_count} ads")
+
+async def sync_seller_summary_job(payload: dict, job: dict):
+    # Read the user at run time so retried or overlapping jobs converge on the latest profile.
+    # Enqueues are deduped while this job runs, so re-check for a change made meanwhile.
+    summary = None
+    while True:
+        user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "name": 1, "picture": 1})
+        if not user or seller_summary(user) == summary:
+            return
+        summary = seller_summary(user)
+        result = await db.ads.update_many(
+            {"user_id": payload["user_id"], "seller": {"$ne": summary}},
+            {"$set": {"seller": summary}}
+        )
+        if result.modified_count:
+            logger.info(f"Updated seller summary on {result.modified_count} ads of {payload['user_id']}")
+
+async def backfill_seller_summaries_job(payload: dict, job: dict):
+    # Ads created before seller summaries were embedded
+    user_ids = await db.ads.distinct("user_id", {"seller": {"$exists": False}})
+    batch_size = 500
+    for start in range(0, len(user_ids), batch_size):
+        users = await db.users.find(
+            {"user_id": {"$in": user_ids[start:start + batch_size]}},
+            {"_id": 0, "user_id": 1, "name": 1, "picture": 1}
+        ).to_list(None)
+        if users:
+            await db.ads.bulk_write([
+                UpdateMany(
+                    {"user_id": user["user_id"], "seller": {"$exists": False}},
+                    {"$set": {"seller": seller_summary(user)}}
+                )
+                for user in users
+            ], ordered=False)
+
+job_handlers = {
+    "expire_ads": expire_ads_job,
+    "expire_boosts": expire_boosts_job,
+    "reconcile_payments": reconcile_payments_job,
+    "notify_saved_search_matches": notify_saved_search_matches_job,
+    "sync_seller_summary": sync_seller_summary_job,
+    "backfill_seller_summaries": backfill_seller_summaries_job,
+}
+
+def build_job_worker() -> JobWorker:
+    return JobWorker(
+        job_queue,
+        job_handlers,
+        concurrency=env_int('JOB_WORKER_CONCURRENCY', 4),
+        lease_seconds=env_float('JOB_LEASE_SECONDS', 60.0),
+        poll_interval=env_float('JOB_POLL_INTERVAL_SECONDS', 1.0),
+        periodic={
+            "expire_ads": env_float('AD_EXPIRY_SWEEP_SECONDS', 300.0),
+            "expire_boosts": env_float('BOOST_EXPIRY_SWEEP_SECONDS', 300.0),
+            "reconcile_payments": env_float('PAYMENT_RECONCILE_INTERVAL_SECONDS', 300.0),
+        },
+    )
+
+background_tasks: List[asyncio.Task] = []
+
+# Set JOB_WORKER_MODE=external and run `python worker.py` to process jobs out of process
+job_worker: Optional[JobWorker] = None
+
+# Health endpoints
+@api_router.get("/health")
+async def health():
+    # Liveness only: no I/O so it stays cheap under any load
+    return {"status": "ok"}
+
+@api_router.get("/ready")
+async def ready():
+    result = await readiness_probe.status()
+    return JSONResponse(status_code=200 if result["ready"] else 503, content=result)
+
+@api_router.get("/diagnostics")
+async def diagnostics(x_diagnostics_token: Optional[str] = Header(None)):
+    # Fail closed: without a configured token the endpoint is disabled
+    token = os.environ.get("DIAGNOSTICS_TOKEN")
+    if not token or not x_diagnostics_token or not hmac.compare_digest(x_diagnostics_token.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {
+        "mongo": {
+            "max_pool_size": client.options.pool_options.max_pool_size,
+            "min_pool_size": client.options.pool_options.min_pool_size,
+            "pools": pool_monitor.snapshot(),
+        },
+        "readiness": await readiness_probe.status(),
+        "event_loop_lag": loop_lag_monitor.snapshot(),
+        "outbound_http": outbound_stats.snapshot(http_session),
+        "stripe_webhooks": stripe_event_ledger.snapshot(),
+        "jobs": {
+            **await job_queue.metrics(),
+            "worker": job_worker.snapshot() if job_worker else None,
+        },
+        "payment_reconciliation": payment_reconciler.snapshot(),
+        "saved_search_index": saved_search_index.snapshot(),
+        "ad_events": ad_event_broker.snapshot(),
+        "suggest_index": suggest_index.snapshot(),
+        "similar_index": similar_index.snapshot(),
+        "duplicate_index": duplicate_index.snapshot(),
+        "read_routing": read_router.snapshot(),
+        "price_stats": price_stats.snapshot(),
+    }
 
 app.include_router(api_router)
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=env_int('COMPRESSION_MIN_SIZE', 1024),
+    gzip_level=env_int('COMPRESSION_GZIP_LEVEL', 6),
+    brotli_quality=env_int('COMPRESSION_BROTLI_QUALITY', 4),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -714,6 +1569,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_runtime():
+    global http_session, job_worker
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=env_int('OUTBOUND_POOL_SIZE', 100),
+            limit_per_host=env_int('OUTBOUND_POOL_SIZE_PER_HOST', 0),
+        ),
+        timeout=aiohttp.ClientTimeout(total=env_float('OUTBOUND_TIMEOUT_SECONDS', 15.0)),
+        trace_configs=[outbound_stats.trace_config()],
+    )
+    loop_lag_monitor.start()
+    await stripe_event_ledger.start()
+    await db.ads.create_index("ad_id", unique=True)
+    await db.ads.create_index([("status", 1), ("expires_at", 1)])
+    await db.ads.create_index([("location.coordinates", "2dsphere")])
+    await db.ads.create_index([("rank_key", 1), ("boost_expires_at", 1)])
+    await db.ads.create_index([("user_id", 1), ("created_at", -1)])
+    paid_ad_ids = await db.payment_transactions.distinct("ad_id", {"payment_status": "paid", "ad_id": {"$ne": None}})
+    await db.ads.update_many({"rank_key": {"$exists": False}, "ad_id": {"$in": paid_ad_ids}}, backfill_pipeline(paid=True))
+    await db.ads.update_many({"rank_key": {"$exists": False}}, backfill_pipeline(paid=False))
+    for index_keys in planned_indexes():
+        await db.ads.create_index(index_keys)
+    await job_queue.ensure_indexes()
+    if await db.ads.find_one({"seller": {"$exists": False}}, {"_id": 1}):
+        await job_queue.enqueue("backfill_seller_summaries", dedupe_key="backfill_seller_summaries")
+    await payment_reconciler.ensure_indexes()
+    await db.saved_searches.create_index([("user_id", 1), ("status", 1)])
+    await db.saved_searches.create_index("updated_at")
+    await db.notifications.create_index("notification_id", unique=True)
+    await db.user_sessions.create_index("session_token")
+    await db.notifications.create_index([("user_id", 1), ("created_at", -1)])
+    await db.ad_fingerprints.create_index("ad_id", unique=True)
+    await db.price_stats.create_index("group", unique=True)
+    await sync_saved_searches()
+    await ad_event_broker.start(db.ads, mode=os.environ.get('AD_EVENTS_SOURCE', 'auto'))
+    load_suggest_taxonomy()
+    await refresh_suggest_index()
+    # Serve the last snapshot until the feed's first scheduled rebuild restores exact per-ad state
+    await load_price_stats_snapshot()
+    background_tasks.append(asyncio.create_task(run_ad_index_feed()))
+    background_tasks.append(asyncio.create_task(run_saved_search_sync()))
+    if os.environ.get('JOB_WORKER_MODE', 'inprocess') == 'inprocess':
+        job_worker = build_job_worker()
+        await job_worker.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await ad_event_broker.stop()
+    await loop_lag_monitor.stop()
+    await stripe_event_ledger.stop()
+    if job_worker is not None:
+        await job_worker.stop()
+    if http_session is not None:
+        await http_session.close()
     client.close()
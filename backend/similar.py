@@ -0,0 +1,197 @@
+"""Similar-ad recommendations over precomputed per-category vectors.
+
+Each ad becomes one float32 row that concatenates, with per-block weights:
+
+* hashed, IDF-weighted term frequencies of its title and description;
+* a 2-D unit vector whose angle encodes log-price;
+* a 3-D unit vector for its position on the globe.
+
+Every block is unit length, so a single dot product gives a weighted sum of
+text cosine, price closeness and geographic closeness, and a whole category
+is scored with one matrix-vector product.
+"""
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(ad: dict) -> Counter:
+    counts = Counter(TOKEN_RE.findall((ad.get("description") or "").lower()))
+    # Titles are short and descriptive, so weigh their terms more
+    for token in TOKEN_RE.findall((ad.get("title") or "").lower()):
+        counts[token] += 2
+    return counts
+
+
+class _CategoryMatrix:
+    __slots__ = ("matrix", "ids", "rows", "free", "size")
+
+    def __init__(self, dims: int, capacity: int = 256):
+        self.matrix = np.zeros((capacity, dims), dtype=np.float32)
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.size = 0
+
+    def put(self, ad_id: str, vector: np.ndarray):
+        row = self.rows.get(ad_id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                if self.size == len(self.ids):
+                    grown = np.zeros((len(self.ids) * 2, self.matrix.shape[1]), dtype=np.float32)
+                    grown[:self.size] = self.matrix[:self.size]
+                    self.matrix = grown
+                    self.ids.extend([None] * (len(grown) - len(self.ids)))
+                row = self.size
+                self.size += 1
+            self.rows[ad_id] = row
+            self.ids[row] = ad_id
+        self.matrix[row] = vector
+
+    def remove(self, ad_id: str):
+        row = self.rows.pop(ad_id, None)
+        if row is not None:
+            self.matrix[row] = 0.0
+            self.ids[row] = None
+            self.free.append(row)
+
+
+class SimilarAdsIndex:
+    def __init__(
+        self,
+        text_dims: int = 256,
+        text_weight: float = 0.7,
+        price_weight: float = 0.15,
+        geo_weight: float = 0.15,
+        max_log_price: float = math.log1p(10_000_000),
+    ):
+        self.text_dims = text_dims
+        self.dims = text_dims + 2 + 3
+        self.max_log_price = max_log_price
+        self._block_scale = (
+            math.sqrt(text_weight),
+            math.sqrt(price_weight),
+            math.sqrt(geo_weight),
+        )
+        self._categories: Dict[str, _CategoryMatrix] = {}
+        self._idf: Dict[str, np.ndarray] = {}
+        self._ad_category: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _hash(self, token: str) -> Tuple[int, float]:
+        h = zlib.crc32(token.encode("utf-8"))
+        # One bit picks the sign so colliding terms tend to cancel out rather than add up
+        return h % self.text_dims, 1.0 if (h >> 31) & 1 else -1.0
+
+    def _term_frequencies(self, ad: dict) -> np.ndarray:
+        tf = np.zeros(self.text_dims, dtype=np.float32)
+        for token, count in _tokens(ad).items():
+            bucket, sign = self._hash(token)
+            tf[bucket] += sign * (1.0 + math.log(count))
+        return tf
+
+    def vectorize(self, ad: dict, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        text_scale, price_scale, geo_scale = self._block_scale
+        vector = np.zeros(self.dims, dtype=np.float32)
+
+        text = self._term_frequencies(ad)
+        if idf is not None:
+            text *= idf
+        norm = np.linalg.norm(text)
+        if norm > 0:
+            vector[:self.text_dims] = text / norm * text_scale
+
+        price = ad.get("price")
+        if price is not None and price >= 0:
+            angle = min(math.log1p(price) / self.max_log_price, 1.0) * math.pi / 2
+            vector[self.text_dims] = math.cos(angle) * price_scale
+            vector[self.text_dims + 1] = math.sin(angle) * price_scale
+
+        location = ad.get("location") or {}
+        lat, lng = location.get("latitude"), location.get("longitude")
+        if lat is not None and lng is not None:
+            lat, lng = math.radians(lat), math.radians(lng)
+            offset = self.text_dims + 2
+            vector[offset] = math.cos(lat) * math.cos(lng) * geo_scale
+            vector[offset + 1] = math.cos(lat) * math.sin(lng) * geo_scale
+            vector[offset + 2] = math.sin(lat) * geo_scale
+        return vector
+
+    def rebuild(self, ads: Iterable[dict]):
+        """Recompute IDF and every vector from scratch, then swap them in."""
+        by_category: Dict[str, List[dict]] = {}
+        for ad in ads:
+            by_category.setdefault(ad["category"], []).append(ad)
+
+        categories, idfs, ad_category = {}, {}, {}
+        for category, category_ads in by_category.items():
+            tfs = np.stack([self._term_frequencies(ad) for ad in category_ads])
+            document_frequency = np.count_nonzero(tfs, axis=0)
+            idf = np.log((1 + len(category_ads)) / (1 + document_frequency)).astype(np.float32) + 1.0
+            matrix = _CategoryMatrix(self.dims, capacity=max(256, len(category_ads) + len(category_ads) // 4))
+            for ad in category_ads:
+                matrix.put(ad["ad_id"], self.vectorize(ad, idf))
+                ad_category[ad["ad_id"]] = category
+            categories[category] = matrix
+            idfs[category] = idf
+
+        with self._lock:
+            self._categories, self._idf, self._ad_category = categories, idfs, ad_category
+
+    def upsert(self, ad: dict):
+        with self._lock:
+            previous = self._ad_category.get(ad["ad_id"])
+            if previous is not None and previous != ad["category"]:
+                self._categories[previous].remove(ad["ad_id"])
+            matrix = self._categories.get(ad["category"])
+            if matrix is None:
+                matrix = self._categories[ad["category"]] = _CategoryMatrix(self.dims)
+            # New ads reuse the category's IDF from the last rebuild
+            matrix.put(ad["ad_id"], self.vectorize(ad, self._idf.get(ad["category"])))
+            self._ad_category[ad["ad_id"]] = ad["category"]
+
+    def remove(self, ad_id: str):
+        with self._lock:
+            category = self._ad_category.pop(ad_id, None)
+            if category is not None:
+                self._categories[category].remove(ad_id)
+
+    def similar(self, ad: dict, limit: int = 6) -> List[Tuple[str, float]]:
+        """Most similar active ads in ``ad``'s category, best first."""
+        with self._lock:
+            matrix = self._categories.get(ad["category"])
+            if matrix is None or matrix.size == 0:
+                return []
+            row = matrix.rows.get(ad["ad_id"])
+            if row is not None:
+                query = matrix.matrix[row]
+            else:
+                query = self.vectorize(ad, self._idf.get(ad["category"]))
+            scores = matrix.matrix[:matrix.size] @ query
+            if row is not None:
+                scores[row] = -np.inf
+            for free_row in matrix.free:
+                scores[free_row] = -np.inf
+
+            k = min(limit, matrix.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(matrix.ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "ads": len(self._ad_category),
+                "categories": {category: matrix.size - len(matrix.free) for category, matrix in self._categories.items()},
+                "dims": self.dims,
+                "matrix_bytes": sum(matrix.matrix.nbytes for matrix in self._categories.values()),
+            }
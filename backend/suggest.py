@@ -0,0 +1,243 @@
+"""In-memory prefix index for search-box suggestions.
+
+Terms are kept in a sorted list of ``"<key>\\x00<term>"`` strings, where each
+key is the term starting at one of its word boundaries (so "bmw" finds
+"Used BMW 320d"). A prefix lookup is two ``bisect`` calls that size the
+matching slice. Small slices are scanned for their top-k; for large ones it
+is cheaper to walk every term in descending weight order and stop at the
+first ``limit`` that match, since about one in ``keys / slice`` terms does.
+The lookup picks whichever of the two is expected to touch fewer entries,
+which keeps either bounded by roughly ``sqrt(limit * keys)``.
+"""
+import heapq
+import re
+import sys
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+SEPARATOR = "\x00"
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+SOURCE_WEIGHTS = {"category": 5.0, "subcategory": 5.0, "query": 1.0, "ad_title": 1.0}
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD_RE.findall((text or "").lower()))
+
+
+class SuggestIndex:
+    def __init__(
+        self,
+        max_suffixes: int = 4,
+        popular_query_min: int = 3,
+        max_pending_queries: int = 50000,
+    ):
+        self.max_suffixes = max_suffixes
+        self.popular_query_min = popular_query_min
+        self.max_pending_queries = max_pending_queries
+        self._keys: List[str] = []
+        self._terms: Dict[str, dict] = {}
+        # (-weight, len, term) ascending, i.e. the suggestion order
+        self._ranked: List[Tuple[float, int, str]] = []
+        self._ad_titles: Dict[str, str] = {}
+        self._pending_queries: Dict[str, Set[str]] = {}
+        self._key_bytes = 0
+        self.stats = {"lookups": 0, "ranked_walks": 0, "last_lookup_us": 0.0, "last_lookup_visited": 0}
+
+    def _term_keys(self, term: str) -> List[str]:
+        keys = [term + SEPARATOR + term]
+        for match in list(WORD_RE.finditer(term))[1:self.max_suffixes]:
+            keys.append(term[match.start():] + SEPARATOR + term)
+        return keys
+
+    def _term_matches(self, term: str, prefix: str) -> bool:
+        # Same word boundaries as _term_keys; normalized terms are single-space separated
+        start = 0
+        for _ in range(self.max_suffixes):
+            if term.startswith(prefix, start):
+                return True
+            start = term.find(" ", start) + 1
+            if not start:
+                return False
+        return False
+
+    @staticmethod
+    def _rank(term: str, entry: dict) -> Tuple[float, int, str]:
+        return (-entry["weight"], len(term), term)
+
+    def _unrank(self, term: str, entry: dict):
+        rank = self._rank(term, entry)
+        position = bisect_left(self._ranked, rank)
+        if position < len(self._ranked) and self._ranked[position] == rank:
+            del self._ranked[position]
+
+    def add_term(self, text: str, source: str, weight: Optional[float] = None, category: Optional[str] = None):
+        term = normalize(text)
+        if not term:
+            return
+        weight = SOURCE_WEIGHTS.get(source, 1.0) if weight is None else weight
+        entry = self._terms.get(term)
+        if entry is None:
+            entry = self._terms[term] = {"text": text.strip(), "weight": 0.0, "sources": {}, "category": category}
+            for key in self._term_keys(term):
+                insort(self._keys, key)
+                self._key_bytes += sys.getsizeof(key)
+        else:
+            self._unrank(term, entry)
+        entry["weight"] += weight
+        entry["sources"][source] = entry["sources"].get(source, 0.0) + weight
+        if category and not entry["category"]:
+            entry["category"] = category
+        insort(self._ranked, self._rank(term, entry))
+
+    def remove_term(self, text: str, source: str, weight: Optional[float] = None):
+        term = normalize(text)
+        entry = self._terms.get(term)
+        if entry is None:
+            return
+        weight = SOURCE_WEIGHTS.get(source, 1.0) if weight is None else weight
+        self._unrank(term, entry)
+        entry["weight"] -= weight
+        remaining = entry["sources"].get(source, 0.0) - weight
+        if remaining > 1e-9:
+            entry["sources"][source] = remaining
+        else:
+            entry["sources"].pop(source, None)
+        if entry["weight"] > 1e-9 and entry["sources"]:
+            insort(self._ranked, self._rank(term, entry))
+        else:
+            del self._terms[term]
+            for key in self._term_keys(term):
+                position = bisect_left(self._keys, key)
+                if position < len(self._keys) and self._keys[position] == key:
+                    del self._keys[position]
+                    self._key_bytes -= sys.getsizeof(key)
+
+    def upsert_ad(self, ad_id: str, title: Optional[str]):
+        previous = self._ad_titles.get(ad_id)
+        if previous == title:
+            return
+        if previous is not None:
+            self.remove_term(previous, "ad_title")
+        if title:
+            self._ad_titles[ad_id] = title
+            self.add_term(title, "ad_title")
+        else:
+            self._ad_titles.pop(ad_id, None)
+
+    def remove_ad(self, ad_id: str):
+        self.upsert_ad(ad_id, None)
+
+    def record_query(self, query: str, client: str):
+        """Count a search that returned results.
+
+        It becomes a suggestion once ``popular_query_min`` distinct clients
+        have run it, so a single client cannot plant suggestions.
+        """
+        term = normalize(query)
+        if not term:
+            return
+        if term in self._terms and "query" in self._terms[term]["sources"]:
+            self.add_term(query, "query")
+            return
+        clients = self._pending_queries.setdefault(term, set())
+        clients.add(client)
+        if len(clients) >= self.popular_query_min:
+            del self._pending_queries[term]
+            self.add_term(query, "query", weight=float(len(clients)))
+            return
+        if len(self._pending_queries) > self.max_pending_queries:
+            # Forget the long tail of one-off queries
+            self._pending_queries = {t: c for t, c in self._pending_queries.items() if len(c) > 1}
+
+    def sync_ads(self, ads):
+        """Reconcile ad titles with ``(ad_id, title)`` pairs of every active ad.
+
+        When the index holds no ads yet, keys are appended and sorted once
+        instead of inserted one by one.
+        """
+        if not self._ad_titles:
+            new_keys = []
+            for ad_id, title in ads:
+                term = normalize(title)
+                if not term:
+                    continue
+                self._ad_titles[ad_id] = title
+                entry = self._terms.get(term)
+                if entry is None:
+                    entry = self._terms[term] = {"text": title.strip(), "weight": 0.0, "sources": {}, "category": None}
+                    new_keys.extend(self._term_keys(term))
+                weight = SOURCE_WEIGHTS["ad_title"]
+                entry["weight"] += weight
+                entry["sources"]["ad_title"] = entry["sources"].get("ad_title", 0.0) + weight
+            self._keys.extend(new_keys)
+            self._keys.sort()
+            self._key_bytes += sum(sys.getsizeof(key) for key in new_keys)
+            self._ranked = sorted(self._rank(term, entry) for term, entry in self._terms.items())
+            return
+
+        active = set()
+        for ad_id, title in ads:
+            active.add(ad_id)
+            self.upsert_ad(ad_id, title)
+        for ad_id in [ad_id for ad_id in self._ad_titles if ad_id not in active]:
+            self.remove_ad(ad_id)
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[dict]:
+        started = time.perf_counter()
+        self.stats["lookups"] += 1
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\uffff", lo)
+        matching = hi - lo
+        if matching * matching <= limit * len(self._keys):
+            seen = set()
+            for key in self._keys[lo:hi]:
+                seen.add(key.rsplit(SEPARATOR, 1)[1])
+            top = heapq.nsmallest(limit, (self._rank(term, self._terms[term]) for term in seen))
+            results = [self._public(term) for _, _, term in top]
+            visited = matching
+        else:
+            self.stats["ranked_walks"] += 1
+            results = []
+            visited = 0
+            for _, _, term in self._ranked:
+                visited += 1
+                if self._term_matches(term, prefix):
+                    results.append(self._public(term))
+                    if len(results) == limit:
+                        break
+
+        self.stats["last_lookup_visited"] = visited
+        self.stats["last_lookup_us"] = round((time.perf_counter() - started) * 1_000_000, 1)
+        return results
+
+    def _public(self, term: str) -> dict:
+        entry = self._terms[term]
+        source = max(entry["sources"], key=entry["sources"].get)
+        suggestion = {"text": entry["text"], "type": source}
+        if entry["category"]:
+            suggestion["category"] = entry["category"]
+        return suggestion
+
+    def snapshot(self) -> dict:
+        memory = (
+            sys.getsizeof(self._keys)
+            + self._key_bytes
+            + sys.getsizeof(self._terms)
+            + sys.getsizeof(self._ranked)
+            + sys.getsizeof(self._ad_titles)
+            + sys.getsizeof(self._pending_queries)
+        )
+        return {
+            **self.stats,
+            "terms": len(self._terms),
+            "keys": len(self._keys),
+            "ads": len(self._ad_titles),
+            "pending_queries": len(self._pending_queries),
+            "approx_memory_bytes": memory,
+        }
@@ -0,0 +1,219 @@
+"""Stripe webhook verification and an idempotent, asynchronously processed event ledger."""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookSignatureError(Exception):
+    pass
+
+
+def sign_stripe_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """Build a ``Stripe-Signature`` header value the same way Stripe does."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode("utf-8") + payload
+    signature = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def verify_stripe_signature(payload: bytes, header: Optional[str], secret: str, tolerance: int = 300) -> dict:
+    """Check a ``Stripe-Signature`` header and return the normalized event."""
+    if not header:
+        raise WebhookSignatureError("Missing signature")
+    timestamp = None
+    signatures = []
+    for item in header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if timestamp is None or not timestamp.isdigit() or not signatures:
+        raise WebhookSignatureError("Malformed signature header")
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        raise WebhookSignatureError("Signature timestamp outside tolerance")
+
+    expected = sign_stripe_payload(payload, secret, int(timestamp)).split("v1=", 1)[1]
+    if not any(hmac.compare_digest(expected.encode(), signature.encode()) for signature in signatures):
+        raise WebhookSignatureError("Signature mismatch")
+
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        raise WebhookSignatureError("Invalid payload")
+    obj = event.get("data", {}).get("object", {})
+    return {
+        "event_id": event.get("id"),
+        "event_type": event.get("type"),
+        "session_id": obj.get("id"),
+        "payment_status": obj.get("payment_status"),
+        "metadata": obj.get("metadata") or {},
+    }
+
+
+class WebhookEventLedger:
+    """Records webhook events once and processes them off the request path.
+
+    The unique ``event_id`` index makes retries from the provider no-ops, and
+    a fixed pool of workers bounds how much load a burst of events can put
+    on the database. Claims are held under a lease, as in ``jobs.py``: an
+    entry left pending or processing by an instance that died becomes
+    claimable once its lease runs out, and every instance periodically
+    requeues such entries. Entries another live instance is processing are
+    left alone.
+    """
+
+    def __init__(
+        self,
+        collection,
+        handler: Callable[[dict], Awaitable[None]],
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        retry_delay: float = 1.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers = []
+        self._recovery: Optional[asyncio.Task] = None
+        self.stats = {"received": 0, "duplicates": 0, "processed": 0, "retried": 0, "failed": 0, "recovered": 0}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("event_id", unique=True)
+        await self.collection.create_index([("status", 1), ("lease_expires_at", 1)])
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    @staticmethod
+    def _iso(dt: datetime) -> str:
+        # Fixed precision keeps lease timestamps lexicographically ordered
+        return dt.isoformat(timespec="microseconds")
+
+    def _claimable(self, now: datetime) -> dict:
+        # Pending entries get a lease too, so one recorded by an instance that died is recovered
+        return {"status": {"$in": ["pending", "processing"]}, "lease_expires_at": {"$lte": self._iso(now)}}
+
+    async def record(self, event: dict) -> bool:
+        """Store an event; returns False if it was already in the ledger."""
+        self.stats["received"] += 1
+        now = self._now()
+        try:
+            await self.collection.insert_one({
+                **event,
+                "status": "pending",
+                "attempts": 0,
+                "lease_expires_at": self._iso(now + timedelta(seconds=self.lease_seconds)),
+                "received_at": now.isoformat(),
+                "updated_at": now.isoformat(),
+            })
+        except DuplicateKeyError:
+            self.stats["duplicates"] += 1
+            return False
+        self._queue.put_nowait(event["event_id"])
+        return True
+
+    async def start(self):
+        await self.ensure_indexes()
+        # Entries from before leases existed
+        await self.collection.update_many(
+            {"status": {"$in": ["pending", "processing"]}, "lease_expires_at": {"$exists": False}},
+            {"$set": {"lease_expires_at": self._iso(self._now())}}
+        )
+        for _ in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker()))
+        self._recovery = asyncio.create_task(self._recover_loop())
+
+    async def recover(self) -> int:
+        """Queue entries whose lease ran out; returns how many were found."""
+        expired = await self.collection.find(self._claimable(self._now()), {"_id": 0, "event_id": 1}).to_list(None)
+        for entry in expired:
+            self._queue.put_nowait(entry["event_id"])
+        self.stats["recovered"] += len(expired)
+        return len(expired)
+
+    async def _recover_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Webhook ledger recovery failed")
+            await asyncio.sleep(self.lease_seconds)
+
+    async def stop(self):
+        # Anything still queued keeps its lease in the ledger and is recovered once it expires
+        tasks = self._workers + ([self._recovery] if self._recovery else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+
+    async def _worker(self):
+        while True:
+            event_id = await self._queue.get()
+            try:
+                await self._process(event_id)
+            except Exception:
+                logger.exception(f"Webhook ledger error for {event_id}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, event_id: str):
+        now = self._now()
+        entry = await self.collection.find_one_and_update(
+            # Pending entries are not being worked on, so any instance may take them
+            {"event_id": event_id, "$or": [{"status": "pending"}, self._claimable(now)]},
+            {"$set": {
+                "status": "processing",
+                "lease_expires_at": self._iso(now + timedelta(seconds=self.lease_seconds)),
+                "updated_at": now.isoformat(),
+            }, "$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if entry is None:
+            return
+
+        try:
+            await self.handler(entry)
+        except Exception as e:
+            if entry["attempts"] >= self.max_attempts:
+                self.stats["failed"] += 1
+                await self._set_status(entry, "failed", str(e))
+                logger.error(f"Webhook event {event_id} failed after {entry['attempts']} attempts: {e}")
+                return
+            self.stats["retried"] += 1
+            await self._set_status(entry, "pending", str(e))
+            delay = self.retry_delay * 2 ** (entry["attempts"] - 1)
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, event_id)
+            return
+
+        self.stats["processed"] += 1
+        await self._set_status(entry, "processed")
+
+    async def _set_status(self, entry: dict, status: str, error: Optional[str] = None):
+        # Every claim bumps attempts, so a worker whose lease was taken over cannot overwrite the new claim
+        await self.collection.update_one(
+            {"event_id": entry["event_id"], "status": "processing", "attempts": entry["attempts"]},
+            {"$set": {"status": status, "last_error": error, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+
+    def snapshot(self):
+        return {**self.stats, "queued": self._queue.qsize(), "workers": len(self._workers)}
@@ -0,0 +1,26 @@
+"""Standalone background job worker.
+
+Run with ``python worker.py`` next to the API started with
+``JOB_WORKER_MODE=external`` to keep job processing out of the web process.
+"""
+import asyncio
+import logging
+
+from server import build_job_worker, client, job_queue
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    await job_queue.ensure_indexes()
+    worker = build_job_worker()
+    logger.info(f"Job worker {worker.worker_id} started")
+    try:
+        await worker.run_forever()
+    finally:
+        await worker.stop()
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
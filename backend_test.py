@@ -1,8 +1,14 @@
 import requests
 import sys
+import os
 import json
+import time
+import uuid
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from webhooks import sign_stripe_payload
+
 class AdsAPITester:
     def __init__(self, base_url="https://classifieds-hub-28.preview.emergentagent.com"):
         self.base_url = base_url
@@ -90,6 +96,78 @@ class AdsAPITester:
         
         return response
 
+    def test_health(self):
+        """Test liveness and readiness probes"""
+        self.run_test("Health Check", "GET", "health", 200)
+        response = self.run_test("Readiness Check", "GET", "ready", 200)
+        
+        if response and response.get('ready') is True:
+            self.log_test("Readiness Content Validation", True)
+        else:
+            self.log_test("Readiness Content Validation", False, f"Unexpected readiness payload: {response}")
+        
+        return response
+
+    def test_diagnostics(self):
+        """Test diagnostics endpoint"""
+        self.run_test("Get Diagnostics - No Token", "GET", "diagnostics", 403)
+        
+        token = os.environ.get('DIAGNOSTICS_TOKEN')
+        if not token:
+            print("\n⏭️  Skipping diagnostics content test: DIAGNOSTICS_TOKEN not set")
+            return {}
+        
+        response = self.run_test("Get Diagnostics", "GET", "diagnostics", 200, headers={'X-Diagnostics-Token': token})
+        
+        if response and all(key in response for key in ['mongo', 'event_loop_lag', 'outbound_http', 'jobs', 'payment_reconciliation', 'saved_search_index', 'ad_events', 'suggest_index', 'similar_index', 'duplicate_index', 'read_routing', 'price_stats']):
+            self.log_test("Diagnostics Content Validation", True)
+        else:
+            self.log_test("Diagnostics Content Validation", False, "Missing diagnostics sections")
+        
+        return response
+
+    def test_categories_caching(self):
+        """Test categories ETag revalidation and compression"""
+        response = requests.get(f"{self.api_url}/categories", headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers.get('ETag')
+        
+        if etag and response.headers.get('Content-Encoding') == 'gzip':
+            self.log_test("Categories Precompressed Response", True)
+        else:
+            self.log_test("Categories Precompressed Response", False, f"Headers: {dict(response.headers)}")
+            return {}
+        
+        self.run_test("Categories Not Modified", "GET", "categories", 304, headers={'If-None-Match': etag})
+        return response.json()
+
+    def test_ads_stream(self):
+        """Test the live ad feed opens as an event stream"""
+        try:
+            response = requests.get(f"{self.api_url}/ads/stream", stream=True, timeout=10)
+            content_type = response.headers.get('Content-Type', '')
+            first_chunk = next(response.iter_content(chunk_size=None), b'')
+            response.close()
+            
+            if response.status_code == 200 and content_type.startswith('text/event-stream') and first_chunk.startswith(b'retry:'):
+                self.log_test("Ads Live Stream", True)
+            else:
+                self.log_test("Ads Live Stream", False, f"Got {response.status_code} {content_type}")
+        except Exception as e:
+            self.log_test("Ads Live Stream", False, f"Exception: {str(e)}")
+
+    def test_suggest(self):
+        """Test type-ahead suggestions"""
+        response = self.run_test("Get Suggestions", "GET", "suggest?q=Ca", 200)
+        texts = [s['text'] for s in response.get('suggestions', [])] if response else []
+        
+        if 'Cars' in texts:
+            self.log_test("Suggestions Include Subcategories", True)
+        else:
+            self.log_test("Suggestions Include Subcategories", False, f"Got: {texts}")
+        
+        self.run_test("Get Suggestions - Empty Query", "GET", "suggest?q=", 200)
+        return response
+
     def test_user_registration(self):
         """Test user registration"""
         timestamp = datetime.now().strftime("%H%M%S")
@@ -159,6 +237,14 @@ class AdsAPITester:
         }
         
         response = self.run_test("Create Free Ad", "POST", "ads", 200, ad_data)
+        
+        if response:
+            seller = response.get('seller') or {}
+            if seller.get('name') == self.user_data.get('name'):
+                self.log_test("Ad Embeds Seller Summary", True)
+            else:
+                self.log_test("Ad Embeds Seller Summary", False, f"Unexpected seller: {seller}")
+        
         return response
 
     def test_create_premium_ad(self):
@@ -206,6 +292,29 @@ class AdsAPITester:
         response = self.run_test("Free Ad Image Limit Enforcement", "POST", "ads", 400, ad_data)
         return response
 
+    def test_duplicate_ad(self):
+        """Test reposting an identical ad is rejected"""
+        if not self.session_token:
+            self.log_test("Duplicate Ad Rejected", False, "No session token available")
+            return {}
+        
+        if os.environ.get('DUPLICATE_AD_ACTION', 'reject') != 'reject':
+            print("\n⏭️  Skipping duplicate ad test: DUPLICATE_AD_ACTION is not 'reject'")
+            return {}
+        
+        # Same text as the free ad, with one photo reused
+        ad_data = {
+            "title": "Test Free Ad - iPhone 13",
+            "description": "A great iPhone 13 in excellent condition. Barely used, comes with original box and charger.",
+            "category": "sales_of_products",
+            "price": 549.99,
+            "images": ["https://images.unsplash.com/photo-1592750475338-74b7b21085ab?w=400"],
+            "is_paid": False
+        }
+        
+        response = self.run_test("Duplicate Ad Rejected", "POST", "ads", 409, ad_data)
+        return response
+
     def test_get_ads(self):
         """Test getting all ads"""
         response = self.run_test("Get All Ads", "GET", "ads", 200)
@@ -218,6 +327,101 @@ class AdsAPITester:
         # Test search filter
         search_response = self.run_test("Get Ads - Search Filter", "GET", "ads?search=iPhone", 200)
         
+        # Test price range and sort orders
+        priced = self.run_test("Get Ads - Price Filter", "GET", "ads?min_price=100&max_price=1000&sort=price_asc", 200)
+        prices = [ad['price'] for ad in priced or []]
+        if prices == sorted(prices) and all(100 <= p <= 1000 for p in prices):
+            self.log_test("Price Filter And Sort Validation", True)
+        else:
+            self.log_test("Price Filter And Sort Validation", False, f"Unexpected prices: {prices}")
+        
+        self.run_test("Get Ads - Price Desc Sort", "GET", "ads?category=vehicles&sort=price_desc", 200)
+        self.run_test("Get Ads - Newest Sort", "GET", "ads?sort=newest", 200)
+        
+        # Default listing is premium-first by the precomputed rank key
+        featured = self.run_test("Get Ads - Featured Sort", "GET", "ads?sort=featured", 200)
+        rank_keys = [ad.get('rank_key', 0) for ad in featured or []]
+        if rank_keys == sorted(rank_keys, reverse=True):
+            self.log_test("Featured Ordering Validation", True)
+        else:
+            self.log_test("Featured Ordering Validation", False, f"Unexpected rank keys: {rank_keys}")
+        self.run_test("Get Ads - Distance Sort", "GET", "ads?sort=distance&lat=38.72&lng=-9.14&radius=50", 200)
+        self.run_test("Get Ads - Distance Sort Without Coordinates", "GET", "ads?sort=distance", 400)
+        self.run_test("Get Ads - Invalid Sort", "GET", "ads?sort=cheapest", 400)
+        self.run_test("Get Ads - Inverted Price Range", "GET", "ads?min_price=500&max_price=100", 400)
+        
+        return response
+
+    def test_get_ads_batch(self, ad_ids):
+        """Test batch ad lookup preserves order and marks missing ids"""
+        if not ad_ids:
+            self.log_test("Get Ads Batch", False, "No ads created to look up")
+            return {}
+        
+        requested = list(reversed(ad_ids)) + ["ad_does_not_exist"]
+        response = self.run_test("Get Ads Batch", "GET", f"ads/batch?ids={','.join(requested)}&view=list", 200)
+        results = response.get('results', []) if response else []
+        
+        if [r['ad_id'] for r in results] == requested and results[-1]['found'] is False and all(r['found'] for r in results[:-1]):
+            self.log_test("Batch Order And Not Found Markers", True)
+        else:
+            self.log_test("Batch Order And Not Found Markers", False, f"Unexpected results: {results}")
+        
+        if all(len(r['ad'].get('images', [])) <= 1 for r in results if r['found']):
+            self.log_test("Batch List Projection", True)
+        else:
+            self.log_test("Batch List Projection", False, "List view returned more than one image")
+        
+        self.run_test("Post Ads Batch", "POST", "ads/batch", 200, {"ids": ad_ids})
+        return response
+
+    def test_similar_ads(self, ad_id):
+        """Test similar ads recommendations"""
+        if not ad_id:
+            self.log_test("Get Similar Ads", False, "No ad created to compare against")
+            return {}
+        
+        response = self.run_test("Get Similar Ads", "GET", f"ads/{ad_id}/similar?limit=4", 200)
+        results = response.get('results', []) if response else []
+        
+        if all(r['ad_id'] != ad_id for r in results) and len(results) <= 4:
+            self.log_test("Similar Ads Exclude Source Ad", True)
+        else:
+            self.log_test("Similar Ads Exclude Source Ad", False, f"Unexpected results: {results}")
+        
+        self.run_test("Get Similar Ads - Unknown Ad", "GET", "ads/ad_does_not_exist/similar", 404)
+        return response
+
+    def test_update_ad_read_your_writes(self, ad_id):
+        """Test an owner's edit is visible on the next read (run against a replica set to exercise routing)"""
+        if not ad_id:
+            self.log_test("Update Ad", False, "No ad created to update")
+            return {}
+        
+        new_title = f"Test Free Ad - iPhone 13 Pro {uuid.uuid4().hex[:6]}"
+        self.run_test("Update Ad", "PUT", f"ads/{ad_id}", 200, {"title": new_title})
+        response = self.run_test("Get Ad After Update", "GET", f"ads/{ad_id}", 200)
+        
+        if response and response.get('title') == new_title:
+            self.log_test("Read Your Own Write", True)
+        else:
+            self.log_test("Read Your Own Write", False, f"Expected title {new_title}, got {response.get('title') if response else None}")
+        
+        return response
+
+    def test_price_stats(self):
+        """Test price statistics endpoint"""
+        response = self.run_test("Get Price Stats", "GET", "stats/prices?category=sales_of_products", 200)
+        
+        if response and 'count' in response and 'quantiles' in response:
+            quantiles = response['quantiles']
+            ordered = [quantiles.get(key) for key in ('p10', 'p25', 'p50', 'p75', 'p90')]
+            if response['count'] == 0 or ordered == sorted(ordered):
+                self.log_test("Price Stats Quantiles Ordered", True)
+            else:
+                self.log_test("Price Stats Quantiles Ordered", False, f"Unordered quantiles: {quantiles}")
+        
+        self.run_test("Get Price Stats - Invalid Category", "GET", "stats/prices?category=not_a_category", 400)
         return response
 
     def test_get_my_ads(self):
@@ -229,6 +433,36 @@ class AdsAPITester:
         response = self.run_test("Get My Ads", "GET", "my-ads", 200)
         return response
 
+    def test_saved_searches(self):
+        """Test saving, listing and deleting a search"""
+        if not self.session_token:
+            self.log_test("Create Saved Search", False, "No session token available")
+            return {}
+        
+        search_data = {
+            "name": "Cheap BMWs",
+            "category": "vehicles",
+            "subcategory": "Cars",
+            "keywords": "bmw",
+            "max_price": 20000
+        }
+        
+        response = self.run_test("Create Saved Search", "POST", "saved-searches", 200, search_data)
+        searches = self.run_test("Get Saved Searches", "GET", "saved-searches", 200)
+        
+        if response and any(s['search_id'] == response.get('search_id') for s in searches or []):
+            self.log_test("Saved Search Listed", True)
+        else:
+            self.log_test("Saved Search Listed", False, "Created search missing from list")
+        
+        self.run_test("Invalid Saved Search Subcategory", "POST", "saved-searches", 400, {"category": "jobs", "subcategory": "Cars"})
+        self.run_test("Get Notifications", "GET", "notifications", 200)
+        
+        if response:
+            self.run_test("Delete Saved Search", "DELETE", f"saved-searches/{response['search_id']}", 200)
+        
+        return response
+
     def test_payment_session_creation(self):
         """Test creating payment session"""
         if not self.session_token:
@@ -249,6 +483,41 @@ class AdsAPITester:
         
         return response
 
+    def test_stripe_webhook_idempotency(self):
+        """Test that a locally signed webhook event is acknowledged once and replays are no-ops"""
+        secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
+        if not secret:
+            print("\n⏭️  Skipping Stripe webhook test: STRIPE_WEBHOOK_SECRET not set")
+            return {}
+        
+        event = {
+            "id": f"evt_test_{uuid.uuid4().hex[:16]}",
+            "type": "checkout.session.completed",
+            "data": {"object": {"id": f"cs_test_{uuid.uuid4().hex[:16]}", "payment_status": "paid", "metadata": {}}}
+        }
+        payload = json.dumps(event).encode('utf-8')
+        timestamp = int(time.time())
+        headers = {'Content-Type': 'application/json', 'Stripe-Signature': sign_stripe_payload(payload, secret, timestamp)}
+        
+        first = requests.post(f"{self.api_url}/webhook/stripe", data=payload, headers=headers)
+        replay = requests.post(f"{self.api_url}/webhook/stripe", data=payload, headers=headers)
+        
+        if first.status_code == 200 and not first.json().get('duplicate'):
+            self.log_test("Stripe Webhook Accepted", True)
+        else:
+            self.log_test("Stripe Webhook Accepted", False, f"Got {first.status_code}: {first.text}")
+        
+        if replay.status_code == 200 and replay.json().get('duplicate') is True:
+            self.log_test("Stripe Webhook Replay Ignored", True)
+        else:
+            self.log_test("Stripe Webhook Replay Ignored", False, f"Got {replay.status_code}: {replay.text}")
+        
+        bad_headers = dict(headers, **{'Stripe-Signature': f"t={timestamp},v1={'0' * 64}"})
+        bad = requests.post(f"{self.api_url}/webhook/stripe", data=payload, headers=bad_headers)
+        self.log_test("Stripe Webhook Bad Signature Rejected", bad.status_code == 400, f"Got {bad.status_code}")
+        
+        return first.json()
+
     def test_logout(self):
         """Test user logout"""
         if not self.session_token:
@@ -270,7 +539,12 @@ class AdsAPITester:
         print("=" * 50)
         
         # Test public endpoints
+        self.test_health()
+        self.test_diagnostics()
         self.test_categories()
+        self.test_categories_caching()
+        self.test_ads_stream()
+        self.test_suggest()
         
         # Test authentication flow
         self.test_user_registration()
@@ -281,14 +555,23 @@ class AdsAPITester:
         free_ad = self.test_create_free_ad()
         premium_ad = self.test_create_premium_ad()
         self.test_free_ad_image_limit()
+        self.test_duplicate_ad()
         
         # Test ad retrieval
         self.test_get_ads()
         self.test_get_ads_with_filters()
+        self.test_get_ads_batch([ad['ad_id'] for ad in (free_ad, premium_ad) if ad])
+        self.test_similar_ads(free_ad.get('ad_id') if free_ad else None)
+        self.test_update_ad_read_your_writes(free_ad.get('ad_id') if free_ad else None)
         self.test_get_my_ads()
+        self.test_price_stats()
+        
+        # Test saved searches
+        self.test_saved_searches()
         
         # Test payment
         self.test_payment_session_creation()
+        self.test_stripe_webhook_idempotency()
         
         # Test logout
         self.test_logout()
@@ -2,7 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { Button } from '../components/ui/button';
-import { ArrowLeft, Calendar, Tag, MapPin } from 'lucide-react';
+import { ArrowLeft, Calendar, Tag, MapPin, User } from 'lucide-react';
 import { MapContainer, TileLayer, Marker } from 'react-leaflet';
 import 'leaflet/dist/leaflet.css';
 import L from 'leaflet';
@@ -24,9 +24,11 @@ const AdDetail = () => {
   const navigate = useNavigate();
   const [ad, setAd] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [similarAds, setSimilarAds] = useState([]);
 
   useEffect(() => {
     fetchAd();
+    fetchSimilarAds();
   }, [adId]);
 
   const fetchAd = async () => {
@@ -40,6 +42,15 @@ const AdDetail = () => {
     }
   };
 
+  const fetchSimilarAds = async () => {
+    try {
+      const response = await axios.get(`${API}/ads/${adId}/similar?limit=4`);
+      setSimilarAds(response.data.results);
+    } catch (error) {
+      setSimilarAds([]);
+    }
+  };
+
   const formatDate = (dateString) => {
     const date = new Date(dateString);
     return date.toLocaleDateString('en-US', { year: 'numeric', month: 'long', day: 'numeric' });
@@ -139,6 +150,16 @@ const AdDetail = () => {
                 <Calendar className="w-4 h-4" />
                 <span className="text-sm" data-testid="ad-date">Posted {formatDate(ad.created_at)}</span>
               </div>
+              {ad.seller?.name && (
+                <div className="flex items-center gap-2" data-testid="ad-seller">
+                  {ad.seller.picture ? (
+                    <img src={ad.seller.picture} alt={ad.seller.name} className="w-6 h-6 rounded-full object-cover" />
+                  ) : (
+                    <User className="w-4 h-4" />
+                  )}
+                  <span className="text-sm">{ad.seller.name}</span>
+                </div>
+              )}
             </div>
 
             <div className="bg-white rounded-2xl border border-slate-100 p-8 mb-6">
@@ -184,6 +205,30 @@ const AdDetail = () => {
             )}
           </div>
         </div>
+
+        {similarAds.length > 0 && (
+          <div className="mt-12" data-testid="similar-ads">
+            <h2 className="font-heading font-bold text-2xl text-slate-900 mb-6">Similar ads</h2>
+            <div className="grid grid-cols-2 md:grid-cols-4 gap-6">
+              {similarAds.map((similar) => (
+                <div
+                  key={similar.ad_id}
+                  onClick={() => navigate(`/ads/${similar.ad_id}`)}
+                  className="bg-white rounded-xl border border-slate-100 overflow-hidden cursor-pointer hover:shadow-lg transition-shadow"
+                  data-testid={`similar-ad-${similar.ad_id}`}
+                >
+                  {similar.images && similar.images.length > 0 && (
+                    <img src={similar.images[0]} alt={similar.title} className="w-full h-32 object-cover" />
+                  )}
+                  <div className="p-4">
+                    <p className="font-medium text-slate-900 truncate">{similar.title}</p>
+                    <p className="text-accent font-bold">${similar.price}</p>
+                  </div>
+                </div>
+              ))}
+            </div>
+          </div>
+        )}
       </div>
     </div>
   );
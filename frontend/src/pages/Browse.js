@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
 import axios from 'axios';
 import { Input } from '../components/ui/input';
@@ -10,6 +10,22 @@ import { Collapsible, CollapsibleContent, CollapsibleTrigger } from '../componen
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const LIST_LIMIT = 50;
+
+const distanceKm = (lat1, lng1, lat2, lng2) => {
+  const toRad = (deg) => (deg * Math.PI) / 180;
+  const a = Math.sin(toRad(lat2 - lat1) / 2) ** 2
+    + Math.cos(toRad(lat1)) * Math.cos(toRad(lat2)) * Math.sin(toRad(lng2 - lng1) / 2) ** 2;
+  return 2 * 6371 * Math.asin(Math.min(1, Math.sqrt(a)));
+};
+
+// Merge streamed ads into the list in the same order the listing uses (rank_key, highest first)
+const insertRanked = (list, fresh) => {
+  const known = new Set(list.map(ad => ad.ad_id));
+  const merged = [...list, ...fresh.filter(ad => !known.has(ad.ad_id))];
+  merged.sort((a, b) => (b.rank_key || 0) - (a.rank_key || 0));
+  return merged.slice(0, LIST_LIMIT);
+};
 
 const Browse = () => {
   const navigate = useNavigate();
@@ -20,9 +36,15 @@ const Browse = () => {
   const [searchQuery, setSearchQuery] = useState(searchParams.get('search') || '');
   const [selectedCategory, setSelectedCategory] = useState(searchParams.get('category') || 'all');
   const [selectedSubcategory, setSelectedSubcategory] = useState(searchParams.get('subcategory') || 'all');
+  const selectedCountry = searchParams.get('country') || '';
   const [subcategories, setSubcategories] = useState([]);
   const [locationFilter, setLocationFilter] = useState(null);
   const [showMapSearch, setShowMapSearch] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
+  const filtersRef = useRef({});
+  filtersRef.current = { selectedCategory, selectedSubcategory, selectedCountry, searchQuery, locationFilter };
+  const adsRef = useRef([]);
+  adsRef.current = ads;
 
   useEffect(() => {
     fetchCategories();
@@ -30,7 +52,102 @@ const Browse = () => {
 
   useEffect(() => {
     fetchAds();
-  }, [selectedCategory, selectedSubcategory, locationFilter]);
+  }, [selectedCategory, selectedSubcategory, selectedCountry, locationFilter]);
+
+  useEffect(() => {
+    // Live feed: apply updates/deletes in place and insert matching new ads client-side,
+    // so a new ad costs each open tab one batched point lookup instead of a listing query
+    const params = new URLSearchParams();
+    if (selectedCategory && selectedCategory !== 'all') params.append('category', selectedCategory);
+    if (selectedCountry) params.append('country', selectedCountry);
+    const source = new EventSource(`${API}/ads/stream${params.toString() ? `?${params.toString()}` : ''}`);
+
+    const matchesFilters = (ad) => {
+      const filters = filtersRef.current;
+      if (ad.status && ad.status !== 'active') return false;
+      if (filters.selectedCategory !== 'all' && ad.category !== filters.selectedCategory) return false;
+      if (filters.selectedSubcategory !== 'all' && ad.subcategory !== filters.selectedSubcategory) return false;
+      const country = ad.location ? ad.location.country : ad.country;
+      if (filters.selectedCountry && country !== filters.selectedCountry) return false;
+      if (filters.searchQuery && ad.description !== undefined) {
+        const text = `${ad.title} ${ad.description}`.toLowerCase();
+        if (!text.includes(filters.searchQuery.toLowerCase())) return false;
+      }
+      if (filters.locationFilter && ad.description !== undefined) {
+        const { latitude, longitude, radius } = filters.locationFilter;
+        if (!ad.location || distanceKm(latitude, longitude, ad.location.latitude, ad.location.longitude) > radius) {
+          return false;
+        }
+      }
+      return true;
+    };
+
+    // Jitter spreads the follow-up requests of many tabs receiving the same event
+    const jitter = () => 500 + Math.random() * 2000;
+    let pending = [];
+    let flushTimer = null;
+    let resyncTimer = null;
+
+    const flushCreated = async () => {
+      flushTimer = null;
+      const ids = pending;
+      pending = [];
+      try {
+        const response = await axios.get(`${API}/ads/batch?ids=${ids.join(',')}&view=list`);
+        const fresh = response.data.results.filter(r => r.found).map(r => r.ad).filter(matchesFilters);
+        if (fresh.length) {
+          setAds(prev => insertRanked(prev, fresh));
+        }
+      } catch (error) {
+        console.error('Failed to fetch new ads:', error);
+      }
+    };
+
+    source.addEventListener('create', (e) => {
+      const created = JSON.parse(e.data);
+      if (!matchesFilters(created)) return;
+      pending.push(created.ad_id);
+      if (!flushTimer) flushTimer = setTimeout(flushCreated, jitter());
+    });
+    source.addEventListener('resync', () => {
+      // Missed events: only a full refetch is correct, but don't let every tab do it at once
+      if (!resyncTimer) {
+        resyncTimer = setTimeout(() => {
+          resyncTimer = null;
+          fetchAds();
+        }, jitter());
+      }
+    });
+    source.addEventListener('update', (e) => {
+      const update = JSON.parse(e.data);
+      delete update.type;
+      const current = adsRef.current.find(ad => ad.ad_id === update.ad_id);
+      if (!current) {
+        // An ad edited into the current filters is fetched like a new one
+        if (matchesFilters(update)) {
+          pending.push(update.ad_id);
+          if (!flushTimer) flushTimer = setTimeout(flushCreated, jitter());
+        }
+        return;
+      }
+      const location = current.location ? { ...current.location, country: update.country } : current.location;
+      const merged = { ...current, ...update, location };
+      // Expired, deleted or recategorized ads leave the list
+      const keep = matchesFilters(merged);
+      setAds(prev => (keep
+        ? prev.map(ad => (ad.ad_id === update.ad_id ? { ...ad, ...update, location: merged.location } : ad))
+        : prev.filter(ad => ad.ad_id !== update.ad_id)));
+    });
+    source.addEventListener('delete', (e) => {
+      const { ad_id } = JSON.parse(e.data);
+      setAds(prev => prev.filter(ad => ad.ad_id !== ad_id));
+    });
+    return () => {
+      clearTimeout(flushTimer);
+      clearTimeout(resyncTimer);
+      source.close();
+    };
+  }, [selectedCategory, selectedSubcategory, selectedCountry, locationFilter]);
 
   useEffect(() => {
     // Update subcategories when category changes
@@ -59,13 +176,16 @@ const Browse = () => {
   const fetchAds = async () => {
     setLoading(true);
     try {
-      let url = `${API}/ads?limit=50`;
+      let url = `${API}/ads?limit=${LIST_LIMIT}`;
       if (selectedCategory && selectedCategory !== 'all') {
         url += `&category=${selectedCategory}`;
       }
       if (selectedSubcategory && selectedSubcategory !== 'all') {
         url += `&subcategory=${encodeURIComponent(selectedSubcategory)}`;
       }
+      if (selectedCountry) {
+        url += `&country=${encodeURIComponent(selectedCountry)}`;
+      }
       if (searchQuery) {
         url += `&search=${encodeURIComponent(searchQuery)}`;
       }
@@ -85,6 +205,23 @@ const Browse = () => {
     fetchAds();
   };
 
+  useEffect(() => {
+    // Type-ahead: debounce and hit the lightweight suggest endpoint, not the listing query
+    if (!searchQuery.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/suggest?q=${encodeURIComponent(searchQuery)}&limit=8`);
+        setSuggestions(response.data.suggestions);
+      } catch (error) {
+        setSuggestions([]);
+      }
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
   return (
     <div className="min-h-screen bg-gradient-to-b from-slate-50 to-white">
       <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-12">
@@ -155,8 +292,15 @@ const Browse = () => {
                 value={searchQuery}
                 onChange={(e) => setSearchQuery(e.target.value)}
                 onKeyPress={(e) => e.key === 'Enter' && handleSearch()}
+                list="search-suggestions"
+                autoComplete="off"
                 className="pl-12 h-12 rounded-lg border-slate-200 focus:border-primary"
               />
+              <datalist id="search-suggestions">
+                {suggestions.map((suggestion) => (
+                  <option key={`${suggestion.type}-${suggestion.text}`} value={suggestion.text} />
+                ))}
+              </datalist>
             </div>
             <div className="md:col-span-2">
               <Button
@@ -221,6 +365,9 @@ const Browse = () => {
                   <div className="p-4 space-y-2">
                     <h3 className="font-heading font-semibold text-lg text-slate-900 line-clamp-1">{ad.title}</h3>
                     <p className="text-sm text-slate-600 line-clamp-2">{ad.description}</p>
+                    {ad.seller?.name && (
+                      <p className="text-xs text-slate-500 line-clamp-1" data-testid="ad-card-seller">by {ad.seller.name}</p>
+                    )}
                     <div className="flex justify-between items-center pt-2">
                       <span className="text-2xl font-bold text-accent">${ad.price}</span>
                       <div className="text-right">
@@ -35,6 +35,35 @@ const Dashboard = () => {
     fetchMyAds();
   }, [user, navigate]);
 
+  useEffect(() => {
+    if (!user) return undefined;
+    // Own ads only: apply edits, expiries and deletes in place, fetch ads posted from another tab
+    const source = new EventSource(`${API}/ads/stream?user_id=${encodeURIComponent(user.user_id)}`);
+    const byNewest = (a, b) => new Date(b.created_at) - new Date(a.created_at);
+
+    source.addEventListener('create', async (e) => {
+      const { ad_id } = JSON.parse(e.data);
+      try {
+        const response = await axios.get(`${API}/ads/batch?ids=${ad_id}&view=full`);
+        const fresh = response.data.results.filter(r => r.found).map(r => r.ad);
+        setAds(prev => [...fresh.filter(ad => !prev.some(p => p.ad_id === ad.ad_id)), ...prev].sort(byNewest));
+      } catch (error) {
+        console.error('Failed to fetch new ad:', error);
+      }
+    });
+    source.addEventListener('update', (e) => {
+      const update = JSON.parse(e.data);
+      delete update.type;
+      setAds(prev => prev.map(ad => (ad.ad_id === update.ad_id ? { ...ad, ...update } : ad)));
+    });
+    source.addEventListener('delete', (e) => {
+      const { ad_id } = JSON.parse(e.data);
+      setAds(prev => prev.filter(ad => ad.ad_id !== ad_id));
+    });
+    source.addEventListener('resync', () => fetchMyAds());
+    return () => source.close();
+  }, [user]);
+
   const fetchMyAds = async () => {
     try {
       const response = await axios.get(`${API}/my-ads`, {
@@ -61,7 +90,7 @@ const Dashboard = () => {
         title: 'Success',
         description: 'Ad deleted successfully'
       });
-      fetchMyAds();
+      setAds(prev => prev.filter(ad => ad.ad_id !== deleteAdId));
     } catch (error) {
       toast({
         title: 'Error',
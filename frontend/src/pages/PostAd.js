@@ -31,6 +31,7 @@ const PostAd = () => {
   });
   const [subcategories, setSubcategories] = useState([]);
   const [location, setLocation] = useState(null);
+  const [priceStats, setPriceStats] = useState(null);
 
   useEffect(() => {
     if (!user) {
@@ -40,6 +41,27 @@ const PostAd = () => {
     fetchCategories();
   }, [user, navigate]);
 
+  useEffect(() => {
+    if (!formData.category) {
+      setPriceStats(null);
+      return;
+    }
+    const params = new URLSearchParams({ category: formData.category });
+    if (formData.subcategory) params.append('subcategory', formData.subcategory);
+    if (location?.country) params.append('country', location.country);
+    let cancelled = false;
+    axios.get(`${API}/stats/prices?${params.toString()}`)
+      .then(response => {
+        if (!cancelled) setPriceStats(response.data);
+      })
+      .catch(() => {
+        if (!cancelled) setPriceStats(null);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [formData.category, formData.subcategory, location?.country]);
+
   const fetchCategories = async () => {
     try {
       const response = await axios.get(`${API}/categories`);
@@ -319,6 +341,11 @@ const PostAd = () => {
                 placeholder="0.00"
                 className="h-12 rounded-lg border-slate-200 focus:border-primary focus:ring-1 focus:ring-primary"
               />
+              {priceStats?.count > 0 && (
+                <p className="text-sm text-slate-500" data-testid="price-stats-hint">
+                  Similar ads: median ${priceStats.quantiles.p50}, most between ${priceStats.quantiles.p25} and ${priceStats.quantiles.p75} ({priceStats.count} ads)
+                </p>
+              )}
             </div>
           </div>
 
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL", os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+
+
+@pytest.fixture
+def mongo():
+    """Run ``async def test(db)`` against a throwaway database.
+
+    Skips when no MongoDB server is reachable at ``TEST_MONGO_URL``.
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+
+    def run(test):
+        async def main():
+            client = AsyncIOMotorClient(TEST_MONGO_URL, serverSelectionTimeoutMS=1000)
+            try:
+                await client.admin.command("ping")
+            except PyMongoError:
+                client.close()
+                pytest.skip(f"No MongoDB server at {TEST_MONGO_URL}")
+            db = client[f"test_{uuid.uuid4().hex[:8]}"]
+            try:
+                await test(db)
+            finally:
+                await client.drop_database(db.name)
+                client.close()
+
+        asyncio.run(main())
+
+    return run
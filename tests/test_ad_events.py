@@ -0,0 +1,61 @@
+import asyncio
+
+from ad_events import AdEventBroker
+
+
+def event(ad_id, category="vehicles", country="Portugal", user_id="user_1"):
+    return {"type": "update", "ad_id": ad_id, "category": category, "country": country, "user_id": user_id}
+
+
+def drain(subscription):
+    messages = []
+    while not subscription.queue.empty():
+        messages.append(subscription.queue.get_nowait()[1])
+    return messages
+
+
+def test_subscriptions_filter_by_category_country_and_user():
+    async def main():
+        broker = AdEventBroker()
+        everything = broker.subscribe()
+        vehicles = broker.subscribe(category="vehicles", country="Portugal")
+        own = broker.subscribe(user_id="user_2")
+
+        broker.publish(event("ad_1"))
+        broker.publish(event("ad_2", category="jobs", user_id="user_2"))
+        broker.publish(event("ad_3", country="Spain"))
+
+        assert [e["ad_id"] for e in drain(everything)] == ["ad_1", "ad_2", "ad_3"]
+        assert [e["ad_id"] for e in drain(vehicles)] == ["ad_1"]
+        assert [e["ad_id"] for e in drain(own)] == ["ad_2"]
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_gets_one_resync():
+    async def main():
+        broker = AdEventBroker(queue_size=2)
+        subscription = broker.subscribe()
+        for n in range(5):
+            broker.publish(event(f"ad_{n}"))
+
+        assert await subscription.next(timeout=1) == (None, {"type": "resync"})
+        assert subscription.queue.empty()
+        broker.publish(event("ad_5"))
+        assert (await subscription.next(timeout=1))[1]["ad_id"] == "ad_5"
+
+    asyncio.run(main())
+
+
+def test_unbounded_subscription_never_resyncs():
+    async def main():
+        broker = AdEventBroker(queue_size=2)
+        feed = broker.subscribe(queue_size=0)
+        for n in range(500):
+            broker.publish(event(f"ad_{n}"))
+
+        messages = drain(feed)
+        assert len(messages) == 500
+        assert all(message["type"] == "update" for message in messages)
+
+    asyncio.run(main())
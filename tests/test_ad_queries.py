@@ -0,0 +1,35 @@
+from ad_queries import plan_listing, planned_indexes
+
+
+def test_broad_listing_is_hinted_onto_a_planned_index():
+    sort_spec, hint = plan_listing({"status": "active", "category": "vehicles"}, "featured")
+    assert sort_spec == [("rank_key", -1)]
+    assert hint == [("status", 1), ("category", 1), ("rank_key", -1), ("price", 1)]
+    assert hint in planned_indexes()
+
+
+def test_longest_covered_prefix_wins():
+    query = {"status": "active", "category": "vehicles", "subcategory": "Cars"}
+    _, hint = plan_listing(query, "newest")
+    assert hint == [("status", 1), ("category", 1), ("subcategory", 1), ("created_at", -1), ("price", 1)]
+
+
+def test_price_range_is_covered_by_price_sorts_only():
+    query = {"status": "active", "price": {"$gte": 100, "$lte": 200}}
+    assert plan_listing(query, "price_asc")[1] == [("status", 1), ("price", 1)]
+    assert plan_listing(query, "price_desc")[1] == [("status", 1), ("price", 1)]
+    assert plan_listing(query, "featured") == ([("rank_key", -1)], None)
+
+
+def test_selective_filters_are_left_to_the_planner():
+    search = {"status": "active", "$or": [{"title": {"$regex": "rare"}}]}
+    geo = {"status": "active", "location.coordinates": {"$geoWithin": {}}}
+    uncovered = {"status": "active", "subcategory": "Cars"}
+    for query in (search, geo, uncovered):
+        sort_spec, hint = plan_listing(query, "newest")
+        assert sort_spec == [("created_at", -1)]
+        assert hint is None
+
+
+def test_distance_sort_uses_near_sphere():
+    assert plan_listing({"status": "active", "location.coordinates": {"$nearSphere": [0, 0]}}, "distance") == (None, None)
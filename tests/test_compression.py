@@ -0,0 +1,41 @@
+import gzip
+import json
+
+from starlette.requests import Request
+
+from compression import PrecompressedPayload, negotiate_encoding
+
+
+def request(**headers):
+    raw = [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("gzip;q=0.5, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("*;q=0, identity", ["gzip"]) is None
+
+
+def test_each_encoding_has_its_own_etag():
+    payload = PrecompressedPayload({"a": [1, 2, 3]})
+    plain = payload.response(request())
+    zipped = payload.response(request(accept_encoding="gzip"))
+
+    assert json.loads(plain.body) == {"a": [1, 2, 3]}
+    assert json.loads(gzip.decompress(zipped.body)) == {"a": [1, 2, 3]}
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert plain.headers["etag"] != zipped.headers["etag"]
+
+
+def test_revalidation_uses_weak_comparison():
+    payload = PrecompressedPayload({"a": 1})
+    etag = payload.response(request(accept_encoding="gzip")).headers["etag"]
+
+    assert payload.response(request(accept_encoding="gzip", if_none_match=etag)).status_code == 304
+    assert payload.response(request(accept_encoding="gzip", if_none_match=f'"other", W/{etag}')).status_code == 304
+    assert payload.response(request(accept_encoding="gzip", if_none_match="*")).status_code == 304
+    # The identity representation is a different entity
+    assert payload.response(request(if_none_match=etag)).status_code == 200
+    assert payload.response(request(accept_encoding="gzip", if_none_match='"other"')).status_code == 200
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+from jobs import JobQueue
+
+
+async def make_queue(db, **kwargs):
+    queue = JobQueue(db.jobs, retry_base_delay=0, **kwargs)
+    await queue.ensure_indexes()
+    return queue
+
+
+def test_claim_and_complete(mongo):
+    async def test(db):
+        queue = await make_queue(db)
+        job_id = await queue.enqueue("sweep", {"n": 1}, dedupe_key="sweep")
+
+        job = await queue.claim("w1", ["sweep"], lease_seconds=60)
+        assert job["job_id"] == job_id
+        assert job["status"] == "running"
+        assert job["attempts"] == 1
+        assert await queue.claim("w2", ["sweep"], lease_seconds=60) is None
+
+        await queue.complete(job_id, "w1")
+        done = await db.jobs.find_one({"job_id": job_id})
+        assert done["status"] == "done"
+        assert "dedupe_key" not in done
+        assert isinstance(done["expire_at"], datetime)
+
+    mongo(test)
+
+
+def test_dedupe_key_held_while_active(mongo):
+    async def test(db):
+        queue = await make_queue(db)
+        assert await queue.enqueue("sweep", dedupe_key="periodic:sweep") is not None
+        assert await queue.enqueue("sweep", dedupe_key="periodic:sweep") is None
+
+        job = await queue.claim("w1", ["sweep"], lease_seconds=60)
+        assert await queue.enqueue("sweep", dedupe_key="periodic:sweep") is None
+        await queue.complete(job["job_id"], "w1")
+        assert await queue.enqueue("sweep", dedupe_key="periodic:sweep") is not None
+
+    mongo(test)
+
+
+def test_delayed_and_unknown_jobs_not_claimed(mongo):
+    async def test(db):
+        queue = await make_queue(db)
+        await queue.enqueue("sweep", delay=3600)
+        await queue.enqueue("other")
+        assert await queue.claim("w1", ["sweep"], lease_seconds=60) is None
+
+    mongo(test)
+
+
+def test_expired_lease_is_reclaimed(mongo):
+    async def test(db):
+        queue = await make_queue(db)
+        job_id = await queue.enqueue("sweep")
+        await queue.claim("w1", ["sweep"], lease_seconds=0)
+
+        reclaimed = await queue.claim("w2", ["sweep"], lease_seconds=60)
+        assert reclaimed["job_id"] == job_id
+        assert reclaimed["attempts"] == 2
+
+        # The first worker lost the job; its late heartbeat and completion are ignored
+        assert not await queue.extend_lease(job_id, "w1", 60)
+        await queue.complete(job_id, "w1")
+        assert (await db.jobs.find_one({"job_id": job_id}))["status"] == "running"
+        assert await queue.extend_lease(job_id, "w2", 60)
+
+    mongo(test)
+
+
+def test_retry_then_dead(mongo):
+    async def test(db):
+        queue = await make_queue(db)
+        job_id = await queue.enqueue("flaky", max_attempts=2, dedupe_key="flaky")
+
+        job = await queue.claim("w1", ["flaky"], lease_seconds=60)
+        assert await queue.fail(job, "w1", "boom") == "queued"
+        retried = await db.jobs.find_one({"job_id": job_id})
+        assert retried["last_error"] == "boom"
+        assert "expire_at" not in retried
+
+        job = await queue.claim("w1", ["flaky"], lease_seconds=60)
+        assert await queue.fail(job, "w1", "boom again") == "dead"
+        dead = await db.jobs.find_one({"job_id": job_id})
+        assert dead["status"] == "dead"
+        assert "dedupe_key" not in dead
+        assert await queue.claim("w1", ["flaky"], lease_seconds=60) is None
+
+    mongo(test)
+
+
+def test_retention_and_metrics(mongo):
+    async def test(db):
+        queue = await make_queue(db, done_retention=timedelta(hours=1))
+        await queue.enqueue("sweep")
+        await queue.enqueue("sweep", delay=3600)
+        job = await queue.claim("w1", ["sweep"], lease_seconds=60)
+        await queue.complete(job["job_id"], "w1")
+
+        metrics = await queue.metrics()
+        assert metrics["counts"] == {"queued": 1, "running": 0, "done": 1, "dead": 0}
+
+        done = await db.jobs.find_one({"job_id": job["job_id"]})
+        finished_at = datetime.fromisoformat(done["finished_at"]).replace(tzinfo=None)
+        assert abs((done["expire_at"] - finished_at) - timedelta(hours=1)) < timedelta(seconds=1)
+
+        indexes = await db.jobs.index_information()
+        assert any(spec.get("expireAfterSeconds") == 0 for spec in indexes.values())
+
+    mongo(test)
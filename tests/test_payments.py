@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from payments import PaymentReconciler
+
+
+class FakeCheckout:
+    """Stands in for the checkout API: session id -> (status, payment_status), or an error."""
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.lookups = []
+
+    async def get_checkout_status(self, session_id):
+        self.lookups.append(session_id)
+        result = self.sessions[session_id]
+        if isinstance(result, Exception):
+            raise result
+        status, payment_status = result
+        return SimpleNamespace(status=status, payment_status=payment_status)
+
+
+def transaction(n, session_id, created_at, payment_status="pending", ad_id=None):
+    return {
+        "transaction_id": f"txn_{n}",
+        "session_id": session_id,
+        "ad_id": ad_id,
+        "payment_status": payment_status,
+        "status": "initiated",
+        "created_at": created_at.isoformat(),
+    }
+
+
+def test_reconcile_against_fake_checkout(mongo):
+    async def test(db):
+        now = datetime.now(timezone.utc)
+        old = now - timedelta(days=3)
+        checkout = FakeCheckout({
+            "cs_paid": ("complete", "paid"),
+            "cs_expired": ("expired", "unpaid"),
+            "cs_open": ("open", "unpaid"),
+            "cs_stale_open": ("open", "unpaid"),
+            "cs_error": RuntimeError("upstream timeout"),
+            "cs_stale_error": RuntimeError("upstream timeout"),
+        })
+        await db.ads.insert_many([
+            {"ad_id": "ad_paid", "is_paid": False, "boosted_at": None},
+            {"ad_id": "ad_open", "is_paid": False, "boosted_at": None},
+        ])
+        await db.payment_transactions.insert_many([
+            transaction(1, "cs_paid", now, ad_id="ad_paid"),
+            transaction(2, "cs_expired", now),
+            transaction(3, "cs_open", now, ad_id="ad_open"),
+            transaction(4, "cs_stale_open", old),
+            transaction(5, "cs_error", now),
+            transaction(6, "cs_stale_error", old),
+            transaction(7, "cs_done", now, payment_status="paid"),
+        ])
+
+        reconciler = PaymentReconciler(
+            db.payment_transactions,
+            db.ads,
+            checkout.get_checkout_status,
+            batch_size=2,
+            concurrency=2,
+            stale_after=timedelta(hours=48),
+            upgrade_fields=lambda: {"is_paid": True, "boosted_at": now.isoformat()},
+        )
+        await reconciler.ensure_indexes()
+        result = await reconciler.run()
+
+        assert result == {"scanned": 6, "paid": 1, "expired": 2, "unchanged": 1, "errors": 2}
+        assert "cs_done" not in checkout.lookups
+
+        statuses = {
+            t["session_id"]: t["payment_status"]
+            async for t in db.payment_transactions.find({}, {"_id": 0, "session_id": 1, "payment_status": 1})
+        }
+        assert statuses == {
+            "cs_paid": "paid",
+            "cs_expired": "expired",
+            "cs_open": "unpaid",
+            "cs_stale_open": "expired",
+            "cs_error": "pending",
+            # A failed lookup never expires a session, however old
+            "cs_stale_error": "pending",
+            "cs_done": "paid",
+        }
+        assert (await db.ads.find_one({"ad_id": "ad_paid"}))["is_paid"] is True
+        assert (await db.ads.find_one({"ad_id": "ad_open"}))["is_paid"] is False
+
+        # Once the upstream recovers, the next run resolves what errored
+        checkout.sessions["cs_stale_error"] = ("complete", "paid")
+        checkout.sessions["cs_error"] = ("open", "unpaid")
+        result = await reconciler.run()
+        assert result["paid"] == 1 and result["errors"] == 0
+        paid = await db.payment_transactions.find_one({"session_id": "cs_stale_error"})
+        assert paid["payment_status"] == "paid"
+
+    mongo(test)
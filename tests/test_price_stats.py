@@ -0,0 +1,31 @@
+from price_stats import PriceStatsIndex, group_key
+
+
+def test_snapshot_is_served_until_a_rebuild():
+    source = PriceStatsIndex()
+    source.rebuild([("ad_1", "vehicles", "cars", "Portugal", 1000.0, None),
+                    ("ad_2", "vehicles", "cars", "Spain", 3000.0, None)])
+    documents = source.to_documents()
+    assert {doc["group"] for doc in documents} >= {group_key("vehicles"), group_key("vehicles", "cars", "Spain")}
+
+    restarted = PriceStatsIndex()
+    restarted.load_documents(documents)
+    assert restarted.from_snapshot
+    assert restarted.stats("vehicles")["count"] == 2
+    assert restarted.snapshot()["ads"] == 0
+
+    restarted.rebuild([("ad_1", "vehicles", "cars", "Portugal", 1000.0, None)])
+    assert not restarted.from_snapshot
+    assert restarted.stats("vehicles")["count"] == 1
+
+
+def test_empty_or_late_snapshot_is_ignored():
+    index = PriceStatsIndex()
+    index.load_documents([])
+    assert not index.from_snapshot
+
+    index.upsert("ad_1", "vehicles", None, None, 500.0)
+    index.load_documents(PriceStatsIndex().to_documents() + [{"group": group_key("jobs"), "count": 1, "total": 1.0,
+                                                              "zero_count": 0, "buckets": [[0, 1]]}])
+    assert not index.from_snapshot
+    assert index.stats("jobs")["count"] == 0
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+from ranking import (
+    DEMOTE_PIPELINE,
+    PREMIUM_TIER_OFFSET,
+    backfill_pipeline,
+    epoch_ms,
+    expired_boost_filter,
+    premium_upgrade_fields,
+    unboosted_filter,
+)
+
+CREATED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_expired_boost_is_demoted_and_can_be_boosted_again(mongo):
+    async def test(db):
+        paid_at = CREATED + timedelta(days=1)
+        await db.ads.insert_one({"ad_id": "ad_1", "created_at": CREATED.isoformat(), "boosted_at": None})
+        assert (await db.ads.update_one(unboosted_filter("ad_1"), {"$set": premium_upgrade_fields(paid_at, 7)})).modified_count
+
+        await db.ads.update_many(expired_boost_filter(paid_at + timedelta(days=8)), DEMOTE_PIPELINE)
+        ad = await db.ads.find_one({"ad_id": "ad_1"})
+        assert ad["rank_key"] == epoch_ms(CREATED)
+        assert ad["boosted_at"] is None and ad["boost_expires_at"] is None
+
+        # A second paid boost applies once the first one has ended
+        repaid_at = paid_at + timedelta(days=10)
+        assert (await db.ads.update_one(unboosted_filter("ad_1"), {"$set": premium_upgrade_fields(repaid_at, 7)})).modified_count
+        assert (await db.ads.find_one({"ad_id": "ad_1"}))["rank_key"] >= PREMIUM_TIER_OFFSET
+
+    mongo(test)
+
+
+def test_backfill_only_boosts_paid_ads(mongo):
+    async def test(db):
+        expires = (CREATED + timedelta(days=30)).isoformat()
+        await db.ads.insert_many([
+            {"ad_id": "paid", "is_paid": True, "created_at": CREATED.isoformat(), "expires_at": expires},
+            {"ad_id": "claimed", "is_paid": True, "created_at": CREATED.isoformat(), "expires_at": expires},
+        ])
+        await db.ads.update_many({"ad_id": {"$in": ["paid"]}}, backfill_pipeline(paid=True))
+        await db.ads.update_many({"rank_key": {"$exists": False}}, backfill_pipeline(paid=False))
+
+        paid = await db.ads.find_one({"ad_id": "paid"})
+        assert paid["rank_key"] == PREMIUM_TIER_OFFSET + epoch_ms(CREATED)
+        assert paid["boost_expires_at"] == expires
+        claimed = await db.ads.find_one({"ad_id": "claimed"})
+        assert claimed["rank_key"] == epoch_ms(CREATED)
+        assert claimed["boosted_at"] is None
+
+    mongo(test)
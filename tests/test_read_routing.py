@@ -0,0 +1,80 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from pymongo import MongoClient
+from starlette.responses import Response
+
+import read_routing
+from read_routing import WRITE_COOKIE, ReadRouter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(read_routing.time, "monotonic", lambda: now.value)
+    return now
+
+
+@pytest.fixture
+def db():
+    # Handles are only configured, never used, so no server is needed
+    client = MongoClient("mongodb://localhost:27017", connect=False)
+    yield client["test"]
+    client.close()
+
+
+def test_pins_route_to_primary_until_they_expire(db, clock):
+    router = ReadRouter(db, pin_seconds=10)
+    assert router.for_ad("ad_1") is router.replica
+
+    router.note_write("ad_1")
+    assert router.for_ad("ad_1") is router.primary
+    assert router.for_ads(["ad_2", "ad_1"]) is router.primary
+    assert router.for_ad("ad_2") is router.replica
+
+    clock.value += 10
+    assert router.for_ad("ad_1") is router.replica
+    assert router.snapshot()["active_pins"] == 0
+
+
+def test_prune_drops_expired_and_oldest_pins(db, clock):
+    router = ReadRouter(db, pin_seconds=10, max_pins=2)
+    router.note_write("ad_1")
+    clock.value += 5
+    router.note_write("ad_2")
+    router.note_write("ad_3")
+    assert not router.is_pinned("ad_1")
+    assert router.is_pinned("ad_2") and router.is_pinned("ad_3")
+
+    # Rewriting an ad moves it to the back of the expiry order
+    router.note_write("ad_2")
+    router.note_write("ad_4")
+    assert not router.is_pinned("ad_3")
+    assert router.snapshot()["active_pins"] == 2
+
+
+def test_recent_writer_cookie_routes_any_read_to_primary(db):
+    router = ReadRouter(db, pin_seconds=10)
+    response = Response()
+    router.mark_writer(response)
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{WRITE_COOKIE}=") and "Max-Age=10" in cookie and "HttpOnly" in cookie
+
+    written_at = cookie.split(";", 1)[0].split("=", 1)[1]
+    writer = SimpleNamespace(cookies={WRITE_COOKIE: written_at})
+    assert router.for_ad("ad_1", writer) is router.primary
+    assert router.for_listing(writer) is router.primary
+
+    stale = SimpleNamespace(cookies={WRITE_COOKIE: str(time.time() - 11)})
+    garbage = SimpleNamespace(cookies={WRITE_COOKIE: "soon"})
+    for request in (stale, garbage, SimpleNamespace(cookies={}), None):
+        assert router.for_ad("ad_1", request) is router.replica
+        assert router.for_listing(request) is router.replica
+
+
+def test_primary_mode_ignores_pins(db):
+    router = ReadRouter(db, mode="primary")
+    router.note_write("ad_1")
+    assert router.replica is router.primary
+    assert router.for_ad("ad_1") is router.primary
@@ -0,0 +1,90 @@
+from saved_searches import SavedSearchIndex, haversine_km
+
+LISBON = (38.7223, -9.1393)
+PORTO = (41.1579, -8.6291)
+
+
+def ad(title="Used road bike", description="Carbon frame, barely ridden", category="vehicles",
+       subcategory="Bicycles", country="Portugal", price=800.0, position=LISBON):
+    location = {"country": country, "latitude": position[0], "longitude": position[1]} if position else {"country": country}
+    return {
+        "ad_id": "ad_1",
+        "title": title,
+        "description": description,
+        "category": category,
+        "subcategory": subcategory,
+        "price": price,
+        "location": location,
+    }
+
+
+def search(search_id, **fields):
+    return {"search_id": search_id, "user_id": f"user_{search_id}", **fields}
+
+
+def matched_ids(index, new_ad):
+    return sorted(s["search_id"] for s in index.match(new_ad))
+
+
+def test_exact_fields_and_wildcards():
+    index = SavedSearchIndex()
+    index.load([
+        search("any"),
+        search("category", category="vehicles"),
+        search("subcategory", category="vehicles", subcategory="Bicycles"),
+        search("other_subcategory", category="vehicles", subcategory="Cars"),
+        search("country", country="Portugal"),
+        search("other_country", category="vehicles", country="Spain"),
+        search("other_category", category="jobs"),
+    ])
+    assert matched_ids(index, ad()) == ["any", "category", "country", "subcategory"]
+
+
+def test_keywords_must_all_appear():
+    index = SavedSearchIndex()
+    index.load([
+        search("both", keywords="carbon bike"),
+        search("title_only", keywords="Road"),
+        search("missing", keywords="carbon tandem"),
+    ])
+    assert matched_ids(index, ad()) == ["both", "title_only"]
+
+
+def test_price_range():
+    index = SavedSearchIndex()
+    index.load([
+        search("in_range", min_price=500, max_price=1000),
+        search("too_cheap", max_price=500),
+        search("too_expensive", min_price=1000),
+    ])
+    assert matched_ids(index, ad()) == ["in_range"]
+    assert matched_ids(index, ad(price=None)) == []
+
+
+def test_radius_with_grid_and_wide_searches():
+    index = SavedSearchIndex(cell_degrees=0.5, max_cells_per_search=50)
+    distance = haversine_km(*LISBON, *PORTO)
+    index.load([
+        search("near_lisbon", latitude=LISBON[0], longitude=LISBON[1], radius_km=20),
+        search("near_porto", latitude=PORTO[0], longitude=PORTO[1], radius_km=20),
+        # Covers too many cells for the grid, so it is checked on every ad in its bucket
+        search("wide", latitude=PORTO[0], longitude=PORTO[1], radius_km=distance + 50),
+        search("keyword_and_radius", keywords="bike", latitude=PORTO[0], longitude=PORTO[1], radius_km=20),
+    ])
+    assert matched_ids(index, ad()) == ["near_lisbon", "wide"]
+    assert matched_ids(index, ad(position=PORTO)) == ["keyword_and_radius", "near_porto", "wide"]
+    assert matched_ids(index, ad(position=None)) == []
+
+
+def test_update_and_remove():
+    index = SavedSearchIndex()
+    index.add(search("s1", keywords="tandem"))
+    assert matched_ids(index, ad()) == []
+
+    index.add(search("s1", keywords="carbon"))
+    assert matched_ids(index, ad()) == ["s1"]
+    assert len(index) == 1
+
+    index.remove("s1")
+    assert matched_ids(index, ad()) == []
+    assert index.snapshot()["buckets"] == 0
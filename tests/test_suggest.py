@@ -0,0 +1,59 @@
+import random
+
+from suggest import SuggestIndex, normalize
+
+WORDS = ["used", "new", "bmw", "audi", "bike", "road", "carbon", "sofa", "leather", "iphone", "case", "flat", "lisbon"]
+
+
+def titles(n, seed=7):
+    rng = random.Random(seed)
+    return [(f"ad_{i}", " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))) for i in range(n)]
+
+
+def brute_force(index, prefix, limit):
+    """Reference ranking: every term with a word boundary starting with the prefix."""
+    prefix = normalize(prefix)
+    matches = []
+    for term, entry in index._terms.items():
+        words = term.split(" ")
+        suffixes = [" ".join(words[i:]) for i in range(min(len(words), index.max_suffixes))]
+        if any(suffix.startswith(prefix) for suffix in suffixes):
+            matches.append((-entry["weight"], len(term), term))
+    return [index._terms[term]["text"] for _, _, term in sorted(matches)[:limit]]
+
+
+def test_slice_scan_and_ranked_walk_agree_with_brute_force():
+    index = SuggestIndex()
+    index.add_term("Vehicles", "category", category="vehicles")
+    index.sync_ads(titles(3000))
+    for query in ["u", "used", "used b", "bmw", "road bike", "carbon s", "lisbon flat case", "veh", "zzz"]:
+        assert [s["text"] for s in index.suggest(query, 8)] == brute_force(index, query, 8), query
+    assert index.stats["ranked_walks"] > 0
+
+
+def test_weights_follow_updates_and_removals():
+    index = SuggestIndex()
+    index.sync_ads(titles(500))
+    index.upsert_ad("extra_1", "Used BMW 320d")
+    index.upsert_ad("extra_2", "Used BMW 320d")
+    assert index.suggest("used bmw 3")[0]["text"] == "Used BMW 320d"
+    assert index.suggest("320")[0]["text"] == "Used BMW 320d"
+
+    index.remove_ad("extra_1")
+    index.remove_ad("extra_2")
+    assert index.suggest("used bmw 3") == []
+    for query in ["u", "bmw", "used bmw"]:
+        assert [s["text"] for s in index.suggest(query)] == brute_force(index, query, 8)
+    assert len(index._ranked) == len(index._terms)
+
+
+def test_query_needs_distinct_clients():
+    index = SuggestIndex(popular_query_min=3)
+    for _ in range(5):
+        index.record_query("vintage lamp", "10.0.0.1")
+    assert index.suggest("vintage") == []
+
+    index.record_query("vintage  lamp", "10.0.0.2")
+    index.record_query("Vintage lamp", "10.0.0.3")
+    assert index.suggest("vint") == [{"text": "Vintage lamp", "type": "query"}]
+    assert index.snapshot()["pending_queries"] == 0
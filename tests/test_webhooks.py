@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from webhooks import WebhookEventLedger, WebhookSignatureError, sign_stripe_payload, verify_stripe_signature
+
+SECRET = "whsec_test"
+
+
+def stripe_payload(event_id="evt_1", payment_status="paid"):
+    return json.dumps({
+        "id": event_id,
+        "type": "checkout.session.completed",
+        "data": {"object": {"id": "cs_1", "payment_status": payment_status, "metadata": {"ad_id": "ad_1"}}},
+    }).encode("utf-8")
+
+
+def test_valid_signature_returns_normalized_event():
+    payload = stripe_payload()
+    event = verify_stripe_signature(payload, sign_stripe_payload(payload, SECRET), SECRET)
+    assert event == {
+        "event_id": "evt_1",
+        "event_type": "checkout.session.completed",
+        "session_id": "cs_1",
+        "payment_status": "paid",
+        "metadata": {"ad_id": "ad_1"},
+    }
+
+
+def test_any_matching_v1_signature_is_accepted():
+    payload = stripe_payload()
+    header = sign_stripe_payload(payload, SECRET)
+    timestamp, signature = header.split(",")
+    assert verify_stripe_signature(payload, f"{timestamp},v1={'0' * 64},{signature}", SECRET)["event_id"] == "evt_1"
+
+
+def test_signature_mismatch():
+    payload = stripe_payload()
+    with pytest.raises(WebhookSignatureError, match="mismatch"):
+        verify_stripe_signature(payload, sign_stripe_payload(payload, "whsec_other"), SECRET)
+    with pytest.raises(WebhookSignatureError, match="mismatch"):
+        verify_stripe_signature(stripe_payload(payment_status="unpaid"), sign_stripe_payload(payload, SECRET), SECRET)
+
+
+def test_stale_timestamp():
+    payload = stripe_payload()
+    header = sign_stripe_payload(payload, SECRET, int(time.time()) - 600)
+    with pytest.raises(WebhookSignatureError, match="tolerance"):
+        verify_stripe_signature(payload, header, SECRET, tolerance=300)
+
+
+@pytest.mark.parametrize("header", [None, "", "v1=abc", "t=now,v1=abc", "t=123", "t=123,v1=é"])
+def test_malformed_header(header):
+    payload = stripe_payload()
+    with pytest.raises(WebhookSignatureError):
+        verify_stripe_signature(payload, header, SECRET, tolerance=0)
+
+
+def event(event_id):
+    return {"event_id": event_id, "event_type": "checkout.session.completed", "session_id": "cs_1",
+            "payment_status": "paid", "metadata": {}}
+
+
+async def wait_for_status(collection, event_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        entry = await collection.find_one({"event_id": event_id})
+        if entry and entry["status"] == status:
+            return entry
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{event_id} never reached {status}")
+
+
+def test_duplicate_record_is_ignored(mongo):
+    async def test(db):
+        handled = []
+
+        async def handler(entry):
+            handled.append(entry["event_id"])
+
+        ledger = WebhookEventLedger(db.stripe_events, handler)
+        await ledger.start()
+        try:
+            assert await ledger.record(event("evt_1")) is True
+            assert await ledger.record(event("evt_1")) is False
+            await wait_for_status(db.stripe_events, "evt_1", "processed")
+        finally:
+            await ledger.stop()
+        assert handled == ["evt_1"]
+        assert ledger.stats["duplicates"] == 1
+
+    mongo(test)
+
+
+def test_handler_retries_then_fails(mongo):
+    async def test(db):
+        calls = []
+
+        async def handler(entry):
+            calls.append(entry["attempts"])
+            raise RuntimeError("boom")
+
+        ledger = WebhookEventLedger(db.stripe_events, handler, max_attempts=3, retry_delay=0.01)
+        await ledger.start()
+        try:
+            await ledger.record(event("evt_1"))
+            failed = await wait_for_status(db.stripe_events, "evt_1", "failed")
+        finally:
+            await ledger.stop()
+        assert calls == [1, 2, 3]
+        assert failed["last_error"] == "boom"
+        assert (ledger.stats["retried"], ledger.stats["failed"]) == (2, 1)
+
+    mongo(test)
+
+
+def test_only_expired_leases_are_recovered(mongo):
+    async def test(db):
+        now = datetime.now(timezone.utc)
+
+        def entry(event_id, status, lease_expires_at):
+            return {**event(event_id), "status": status, "attempts": 1,
+                    "lease_expires_at": lease_expires_at.isoformat(timespec="microseconds")}
+
+        await db.stripe_events.insert_many([
+            # Still held by another live instance
+            entry("evt_live", "processing", now + timedelta(seconds=60)),
+            entry("evt_abandoned", "processing", now - timedelta(seconds=1)),
+            entry("evt_orphaned", "pending", now - timedelta(seconds=1)),
+            entry("evt_done", "processed", now - timedelta(seconds=1)),
+        ])
+        handled = []
+
+        async def handler(entry):
+            handled.append(entry["event_id"])
+
+        ledger = WebhookEventLedger(db.stripe_events, handler)
+        await ledger.start()
+        try:
+            await wait_for_status(db.stripe_events, "evt_abandoned", "processed")
+            await wait_for_status(db.stripe_events, "evt_orphaned", "processed")
+        finally:
+            await ledger.stop()
+        assert sorted(handled) == ["evt_abandoned", "evt_orphaned"]
+        assert (await db.stripe_events.find_one({"event_id": "evt_live"}))["status"] == "processing"
+
+    mongo(test)